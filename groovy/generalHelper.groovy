@@ -107,7 +107,7 @@ def mergeBranchIfNeeded() {
 }
 
 def validateCommitHashes(String workspace, String projectDir, String prCommit, String testRunFlag) {
-    def commitHash = getFullCommitHash(workspace, prCommit)
+    def commitHash = getFullCommitHash(workspace, prCommit, projectDir)
     dir(projectDir) {
         def currentHash = getCurrentCommitHash()
         echo "Current Commit Hash: ${currentHash}, Target Commit Hash: ${commitHash}"
@@ -136,9 +136,11 @@ def tryMerge(String destinationBranch) {
 }
 
 
-// Retrieves the full commit hash from Bitbucket Cloud API, since the webhook only gives us the short version.
-def getFullCommitHash(String workspace, String shortCommit) {
-    def fullHash = sh(script: "python '${workspace}/python/get_bitbucket_commit_hash.py' ${shortCommit}", returnStdout: true).trim()
+// Retrieves the full commit hash, since the webhook only gives us the short version.
+// The local clone in projectDir and the agent's hash cache are checked before the Bitbucket Cloud API.
+def getFullCommitHash(String workspace, String shortCommit, String projectDir = null) {
+    def repoDirFlag = projectDir ? " --repo-dir '${projectDir}'" : ""
+    def fullHash = sh(script: "python -S '${workspace}/python/pipeline_client.py' get_bitbucket_commit_hash.py ${shortCommit}${repoDirFlag}", returnStdout: true).trim()
     if (!fullHash) {
         error "Failed to retrieve the full commit hash for ${shortCommit}."
     }
@@ -157,9 +159,11 @@ def isEqualCommitHash(currentHash, commitHash){
 }
 
 // Sends a build status to Bitbucket Cloud API.
+// The status is queued and sent in the background, so the pipeline does not wait on Bitbucket.
+// A final state is flushed before returning so it is delivered before the build ends.
 def sendBuildStatus(workspace, state, commitHash, deployment = false, javascript = false) {
     try {
-        def pythonCommand = "python '${workspace}/python/send_bitbucket_build_status.py' '${commitHash}' '${state}'"
+        def pythonCommand = "python -S '${workspace}/python/pipeline_client.py' send_bitbucket_build_status.py '${commitHash}' '${state}' --queue"
         if (deployment) {
             pythonCommand += " -d"
         }
@@ -170,6 +174,8 @@ def sendBuildStatus(workspace, state, commitHash, deployment = false, javascript
         def exitCode = sh(script: pythonCommand, returnStatus: true)
         if (exitCode != 0) {
             echo "Build status update script failed with exit code: ${exitCode}."
+        } else if (state != "INPROGRESS") {
+            sh(script: "python -S '${workspace}/python/pipeline_client.py' build_status_queue.py flush", returnStatus: true)
         }
     } catch (Exception e) {
         echo "An error occurred while updating the build status: ${e.getMessage()}"
@@ -20,8 +20,10 @@ def findTestingDirs(projectFolder){
 }
 
 // This function will change directory to testing directories to install dependencies.
+// The audit reports of every directory are sent to Bitbucket together as one merged report once all directories are done.
 def installNpmInTestingDirs(testingDirs) {
     def testDirs = testingDirs.split(',')
+    def auditReports = []
     if (testDirs) {
         for (def dirPath : testDirs) {
             // Check if directory exists
@@ -44,15 +46,7 @@ def installNpmInTestingDirs(testingDirs) {
             if (reportFile.exists()) {
                 echo "Audit Report Content:"
                 echo reportFile.text
-
-                // Call the Python script to process the audit report
-                def pythonCommand = "python \"${WORKSPACE}/python/npm_audit.py\" \"${env.COMMIT_HASH}\" \"${dirPath}/audit-report.json\""
-                echo "Executing Python script for audit analysis: ${pythonCommand}"
-                exitCode = sh(script: pythonCommand, returnStatus: true)
-
-                if (exitCode != 0) {
-                    echo "npm_audit.py script encountered an issue. Exit code: ${exitCode}"
-                }
+                auditReports.add("\"${dirPath}/audit-report.json\"")
             } else {
                 echo "Audit report not generated for path: ${dirPath}"
             }
@@ -66,6 +60,17 @@ def installNpmInTestingDirs(testingDirs) {
                 continue
             }
         }
+
+        if (auditReports) {
+            // Call the Python script once to process every directory's audit report
+            def pythonCommand = "python -S \"${WORKSPACE}/python/pipeline_client.py\" npm_audit.py \"${env.COMMIT_HASH}\" ${auditReports.join(' ')}"
+            echo "Executing Python script for audit analysis: ${pythonCommand}"
+            def exitCode = sh(script: pythonCommand, returnStatus: true)
+
+            if (exitCode != 0) {
+                echo "npm_audit.py script encountered an issue. Exit code: ${exitCode}"
+            }
+        }
     } else {
         echo "Testing directories don't exist."
     }
@@ -1,11 +1,11 @@
 // Sends a test report to Bitbucket Cloud API. Testmode can either be EditMode or PlayMode.
 def sendTestReport(workspace, reportDir, commitHash) {
-    sh "python \'${workspace}/python/create_bitbucket_test_report.py\' \'${commitHash}\' \'${reportDir}\'"
+    sh "python -S \'${workspace}/python/pipeline_client.py\' create_bitbucket_test_report.py \'${commitHash}\' \'${reportDir}\'"
 }
 
 // Parses the given log for any errors recorded in a text file of known errors. Not currently in use.
 def parseLogsForError(logPath) {
-    return sh (script: "python \'${workspace}/python/get_unity_failure.py\' \'${logPath}\'", returnStdout: true)
+    return sh (script: "python -S \'${workspace}/python/pipeline_client.py\' get_unity_failure.py \'${logPath}\'", returnStdout: true)
 }
 
 // Checks if an exit code thrown during a test stage should fail the PR Pipeline. ExitCode 2 means failing tests, which we want to report back to Bitbucket
@@ -16,13 +16,27 @@ def checkIfTestStageExitCodeShouldExit(workspace, exitCode) {
     }
 }
 
+// Returns the project's Unity version, revision, executable path and whether it is installed, from a single script call.
+def getUnityProjectInfo(workspace, projectDir) {
+    def output = sh(script: "python -S '${workspace}/python/pipeline_client.py' get_unity_version.py '${projectDir}' all --format env", returnStdout: true).trim()
+    def info = [:]
+    for (line in output.readLines()) {
+        def parts = line.split('=', 2)
+        if (parts.length == 2) {
+            info[parts[0]] = parts[1]
+        }
+    }
+    return info
+}
+
 // Checks if a Unity executable exists and returns its path. Downloads the missing Unity version if not installed.
 def getUnityExecutable(workspace, projectDir) {
     try {
-        def unityExecutable = sh(script: "python '${workspace}/python/get_unity_version.py' '${projectDir}' executable-path", returnStdout: true).trim()
-        if (!fileExists(unityExecutable)) {
-            def version = sh(script: "python '${workspace}/python/get_unity_version.py' '${projectDir}' version", returnStdout: true).trim()
-            def revision = sh(script: "python '${workspace}/python/get_unity_version.py' '${projectDir}' revision", returnStdout: true).trim()
+        def unityInfo = getUnityProjectInfo(workspace, projectDir)
+        def unityExecutable = unityInfo.executable_path
+        if (unityInfo.installed != "true") {
+            def version = unityInfo.version
+            def revision = unityInfo.revision
 
             echo "Unity Editor version ${version} not found. Attempting installation..."
             def installCommand = "\"C:\\Program Files\\Unity Hub\\Unity Hub.exe\" -- --headless install --version ${version} --changeset ${revision}"
@@ -141,15 +155,27 @@ def buildProject(reportDir, projectDir, unityExecutable) {
 // Creates a log report for Unity logs and Jenkins logs, then publishes it to the web server,
 // and lastly sends the build status to Bitbucket.
 def postBuild(status) {
-    sh "python -u \'${env.WORKSPACE}/python/create_log_report.py\'"
+    sh "python -S -u \'${env.WORKSPACE}/python/pipeline_client.py\' create_log_report.py"
 
     sh """ssh vconadmin@dlx-webhost.canadacentral.cloudapp.azure.com \
     \"sudo mkdir -p /var/www/html/${env.FOLDER_NAME}/Reports/${env.TICKET_NUMBER} \
     && sudo chown vconadmin:vconadmin /var/www/html/${env.FOLDER_NAME}/Reports/${env.TICKET_NUMBER}\""""
 
+    def reportHost = "vconadmin@dlx-webhost.canadacentral.cloudapp.azure.com"
+    def reportFolder = "/var/www/html/${env.FOLDER_NAME}/Reports/${env.TICKET_NUMBER}"
+
     if (fileExists("${env.REPORT_DIR}/logs.html")) {
-        sh "scp -i C:/Users/ci-catherine/.ssh/vconkey1.pem -rp \"${env.REPORT_DIR}/logs.html\" \
-    \"vconadmin@dlx-webhost.canadacentral.cloudapp.azure.com:/var/www/html/${env.FOLDER_NAME}/Reports/${env.TICKET_NUMBER}\""
+        // The plain files are always uploaded so the report works on any web server. Their .gz variants go along,
+        // for a server set up to serve them instead (see WebServer/reports-precompressed.conf).
+        sh "scp -i C:/Users/ci-catherine/.ssh/vconkey1.pem -p \"${env.REPORT_DIR}/logs.html\" \"${reportHost}:${reportFolder}\""
+        if (fileExists("${env.REPORT_DIR}/logs.html.gz")) {
+            sh "scp -i C:/Users/ci-catherine/.ssh/vconkey1.pem -p \"${env.REPORT_DIR}/logs.html.gz\" \"${reportHost}:${reportFolder}\""
+        }
+    }
+
+    // The paginated log viewer loads its pages from the logs folder next to logs.html.
+    if (fileExists("${env.REPORT_DIR}/logs/index.json")) {
+        sh "scp -i C:/Users/ci-catherine/.ssh/vconkey1.pem -rp \"${env.REPORT_DIR}/logs\" \"${reportHost}:${reportFolder}\""
     }
 }
 
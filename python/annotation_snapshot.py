@@ -0,0 +1,86 @@
+import os
+import json
+import hashlib
+import requests
+import bitbucket_client
+import cache_utils
+import tracing
+
+# Incremental annotation upload. A snapshot of the annotations last uploaded to a report is kept per PR,
+# as a fingerprint per external_id, and only new or changed annotations are sent again.
+# Annotations that are gone are deleted from the report, unchanged ones are left as they are.
+# Bitbucket keeps reports per commit, so the snapshot is only diffed against when it belongs to the same commit.
+# A new commit starts with an empty report, which still gets the full upload. The snapshot is checked against
+# the annotations actually on the report first, so ones deleted or replaced on Bitbucket are sent again.
+
+# Constant variables:
+CACHE_NAME = "annotation-snapshots"
+
+
+# Function summary: Returns the snapshot file of one report of one PR.
+def get_snapshot_file(pr_key, report_name):
+    snapshot_key = hashlib.sha1(f"{pr_key}|{report_name}".encode("utf-8")).hexdigest()
+    return os.path.join(cache_utils.get_cache_dir(CACHE_NAME), f"{snapshot_key}.json")
+
+# Function summary: Returns a short hash of everything in an annotation, so a changed line or summary is noticed.
+def fingerprint(annotation):
+    return hashlib.sha1(json.dumps(annotation.to_dict(), sort_keys=True).encode("utf-8")).hexdigest()[:16]
+
+# Function summary: Returns the {external_id: fingerprint} snapshot of the commit, or an empty one if the snapshot is of another commit.
+def load_snapshot(snapshot_file, commit):
+    snapshot = cache_utils.read_json(snapshot_file)
+    if not isinstance(snapshot, dict) or snapshot.get("commit") != commit:
+        return {}
+    return snapshot.get("annotations", {})
+
+# Function summary: Returns the snapshot limited to the annotations still on the report, so ones deleted or replaced
+# on Bitbucket are sent again. Only the snapshot's own annotations are considered, since another upload, such as the
+# other test mode's, can share the report. If the report cannot be read, the snapshot is not trusted and everything is uploaded.
+def verify_snapshot(url, previous):
+    try:
+        remote_ids = bitbucket_client.get_annotation_ids(url)
+    except requests.exceptions.RequestException as e:
+        bitbucket_client.print_request_error(e, "Could not read the report's annotations, uploading all of them")
+        return {}
+    return {external_id: value for external_id, value in previous.items() if external_id in remote_ids}
+
+# Function summary: Splits the annotations into the ones to upload and the external ids that are unchanged or resolved.
+def diff_annotations(previous, annotations):
+    changed = []
+    unchanged = []
+    current_ids = set()
+    for annotation in annotations:
+        external_id = annotation.external_id
+        current_ids.add(external_id)
+        if previous.get(external_id) == fingerprint(annotation):
+            unchanged.append(external_id)
+        else:
+            changed.append(annotation)
+    resolved = [external_id for external_id in previous if external_id not in current_ids]
+    return changed, unchanged, resolved
+
+# Function summary: Uploads only the annotations that differ from the report's snapshot and deletes resolved ones,
+# then saves the new snapshot. Annotations that failed to upload are left out of it, so they are sent again next time.
+def upload_changed(url, annotations, pr_key, report_name, commit, max_workers=None):
+    annotations = annotations[:bitbucket_client.MAX_ANNOTATIONS]
+    snapshot_file = get_snapshot_file(pr_key, report_name)
+    previous = load_snapshot(snapshot_file, commit)
+    if previous:
+        previous = verify_snapshot(url, previous)
+    changed, unchanged, resolved = diff_annotations(previous, annotations)
+    tracing.count("annotations_unchanged", len(unchanged))
+    print(f"Incremental upload for {report_name}: {len(changed)} new or changed, {len(unchanged)} unchanged, {len(resolved)} resolved")
+
+    # Resolved annotations go first, so the report stays under the annotation limit
+    deleted = set(bitbucket_client.delete_annotations(url, resolved, max_workers))
+    results = bitbucket_client.upload_annotations(url, changed, max_workers)
+
+    batches = list(bitbucket_client.chunk_annotations(changed, bitbucket_client.BATCH_SIZE))
+    uploaded = [annotation for result in results if result["sent"] for annotation in batches[result["batch"] - 1]]
+
+    snapshot = {external_id: previous[external_id] for external_id in unchanged}
+    snapshot.update((annotation.external_id, fingerprint(annotation)) for annotation in uploaded)
+    # Still on the report, so they are deleted again next time
+    snapshot.update((external_id, previous[external_id]) for external_id in resolved if external_id not in deleted)
+    cache_utils.write_json_atomic(snapshot_file, {"commit": commit, "annotations": snapshot})
+    return results
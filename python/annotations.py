@@ -0,0 +1,132 @@
+import heapq
+import subprocess
+from dataclasses import dataclass
+import bitbucket_client
+import tracing
+
+# The annotation model shared by every reporter, and the selection of the annotations worth sending
+# when a report has more findings than Bitbucket accepts.
+# The selector keeps the top K findings in a heap, ordered by severity, then by whether the file
+# is changed in the PR, then by line. An annotation is only built when it makes it into the heap,
+# so memory and work stay O(K) however many findings there are. Everything dropped is still counted.
+
+# Constant variables:
+SEVERITY_RANK = {"CRITICAL": 4, "HIGH": 3, "MEDIUM": 2, "MODERATE": 2, "LOW": 1, "INFO": 0}
+DROPPED_PATHS_SHOWN = 10
+
+# Values accepted by the Bitbucket REST API
+ANNOTATION_TYPES = {"VULNERABILITY", "CODE_SMELL", "BUG"}
+RESULTS = {"PASSED", "FAILED", "SKIPPED", "IGNORED"}
+SEVERITIES = {"CRITICAL", "HIGH", "MEDIUM", "LOW"}
+SEVERITY_ALIASES = {"MODERATE": "MEDIUM", "INFO": "LOW", "UNKNOWN": "LOW"}  # npm audit's names
+
+
+@dataclass(slots=True)
+class Annotation:
+    # One report annotation. Slots keep the thousands of them a report can have small,
+    # and the values are checked against what the API accepts when the annotation is created.
+    external_id: str
+    annotation_type: str
+    summary: str
+    severity: str
+    result: str = "FAILED"
+    path: str = None
+    line: int = None
+    url: str = None
+
+    def __post_init__(self):
+        self.severity = str(self.severity).upper()
+        self.severity = SEVERITY_ALIASES.get(self.severity, self.severity)
+        if self.annotation_type not in ANNOTATION_TYPES:
+            raise ValueError(f"Unknown annotation type: {self.annotation_type}")
+        if self.severity not in SEVERITIES:
+            raise ValueError(f"Unknown annotation severity: {self.severity}")
+        if self.result not in RESULTS:
+            raise ValueError(f"Unknown annotation result: {self.result}")
+
+    # Function summary: Returns the annotation as the API's JSON object, leaving out the fields that are not set.
+    def to_dict(self):
+        data = {
+            "external_id": self.external_id,
+            "annotation_type": self.annotation_type,
+            "summary": self.summary,
+            "result": self.result,
+            "severity": self.severity
+        }
+        if self.path is not None:
+            data["path"] = self.path
+        if self.line is not None:
+            data["line"] = self.line
+        if self.url is not None:
+            data["url"] = self.url
+        return data
+
+
+class AnnotationSelector:
+    # Keeps the limit most important annotations offered to it, and aggregates of the ones dropped.
+    def __init__(self, limit=bitbucket_client.MAX_ANNOTATIONS, changed_files=None):
+        self.limit = limit
+        self.changed_files = changed_files or set()
+        self.heap = []  # Min-heap of (priority, (severity, path), annotation), the least important on top
+        self.offered = 0
+        self.dropped_by_severity = {}
+        self.dropped_by_path = {}
+
+    # Function summary: Returns the sort key of a finding, larger is more important.
+    # Ties go to the lower line and then to the finding offered first, so the selection is stable.
+    def priority(self, severity, path, line):
+        in_diff = 1 if path in self.changed_files else 0
+        return (SEVERITY_RANK.get(str(severity).upper(), 0), in_diff, -(line or 0), -self.offered)
+
+    # Function summary: Offers one finding. build is only called, to create the annotation, if the finding is kept.
+    def offer(self, build, severity, path=None, line=None):
+        self.offered += 1
+        priority = self.priority(severity, path, line)
+        if len(self.heap) < self.limit:
+            heapq.heappush(self.heap, (priority, (severity, path), build()))
+        elif self.heap and priority > self.heap[0][0]:
+            evicted = heapq.heapreplace(self.heap, (priority, (severity, path), build()))
+            self.record_dropped(*evicted[1])
+        else:
+            self.record_dropped(severity, path)
+
+    def record_dropped(self, severity, path):
+        self.dropped_by_severity[severity] = self.dropped_by_severity.get(severity, 0) + 1
+        if path is not None:
+            self.dropped_by_path[path] = self.dropped_by_path.get(path, 0) + 1
+
+    @property
+    def dropped(self):
+        return self.offered - len(self.heap)
+
+    # Function summary: Returns the kept annotations, the most important first.
+    def select(self):
+        tracing.count("annotations_offered", self.offered)
+        tracing.count("annotations_dropped", self.dropped)
+        return [annotation for priority, details, annotation in sorted(self.heap, key=lambda entry: entry[0], reverse=True)]
+
+    # Function summary: Prints how many findings were dropped, by severity and for the files with the most.
+    def print_dropped_summary(self):
+        if not self.dropped:
+            return
+        print(f"{self.dropped} of {self.offered} findings were not sent, over the {self.limit} annotation limit")
+        for severity, count in sorted(self.dropped_by_severity.items(), key=lambda item: -SEVERITY_RANK.get(str(item[0]).upper(), 0)):
+            print(f" - {severity}: {count}")
+        if self.dropped_by_path:
+            print("Files with the most findings not sent:")
+            for path, count in sorted(self.dropped_by_path.items(), key=lambda item: -item[1])[:DROPPED_PATHS_SHOWN]:
+                print(f" - {path}: {count}")
+
+
+# Function summary: Returns the files changed between base_ref and HEAD in the repository, with "/" separators.
+# An empty set is returned if git cannot tell, the findings are then ranked without it.
+def get_changed_files(repo_dir, base_ref):
+    if not base_ref:
+        return set()
+    try:
+        result = subprocess.run(["git", "-C", repo_dir, "diff", "--name-only", f"{base_ref}...HEAD"], capture_output=True, text=True)
+    except OSError:
+        return set()
+    if result.returncode != 0:
+        return set()
+    return {line.strip() for line in result.stdout.splitlines() if line.strip()}
@@ -0,0 +1,298 @@
+import re
+import sys
+import json
+import time
+import random
+import hashlib
+import argparse
+import threading
+import collections
+from urllib.parse import urlparse, unquote
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+# Local stand-in for the parts of the Bitbucket Cloud API the reporting scripts use, for throughput and
+# rate limit testing without touching production. Point JOB_REPO at http://127.0.0.1:<port>/repositories/<workspace>/<repo>.
+# Latency, server errors, random 429s and a per-token rate limit are configurable, and every request is
+# counted and timed. GET /_stats returns the numbers, POST /_reset clears them and the stored data.
+# Usage: python bitbucket_simulator.py [--port 8765] [--latency-ms 50] [--rate-limit 100 --rate-window 60] ...
+
+# Constant variables:
+MAX_ANNOTATIONS_PER_REQUEST = 100
+MAX_ANNOTATIONS_PER_REPORT = 1000
+COMMIT_PATH = re.compile(r"^/repositories/[^/]+/[^/]+/commit/([^/]+)(/.*)?$")
+
+
+class SimulatorConfig:
+    # How the simulated API behaves. Rates are probabilities between 0 and 1.
+    def __init__(self, latency_ms=0, latency_jitter_ms=0, error_rate=0.0, throttle_rate=0.0, retry_after=1,
+                 rate_limit=0, rate_window=60.0, seed=None):
+        self.latency_ms = latency_ms
+        self.latency_jitter_ms = latency_jitter_ms
+        self.error_rate = error_rate
+        self.throttle_rate = throttle_rate
+        self.retry_after = retry_after
+        self.rate_limit = rate_limit  # Requests per token per window, 0 for no limit
+        self.rate_window = rate_window
+        self.random = random.Random(seed)
+
+
+class SimulatorState:
+    # The stored commits' statuses, reports and annotations, and the request statistics, shared by the handler threads.
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        self.statuses = {}     # (commit, key): status
+        self.reports = {}      # (commit, report id): report
+        self.annotations = {}  # (commit, report id): {external_id: annotation}
+        self.token_requests = collections.defaultdict(collections.deque)
+        self.started = time.time()
+        self.requests = collections.Counter()
+        self.status_codes = collections.Counter()
+        self.tokens = collections.Counter()
+        self.durations = collections.defaultdict(list)
+        self.bytes_received = 0
+        self.annotations_received = 0
+
+    # Function summary: Returns the seconds until the token may send again, or 0 if the request is within its limit.
+    def check_rate_limit(self, token, config):
+        if not config.rate_limit:
+            return 0
+        now = time.monotonic()
+        with self.lock:
+            window = self.token_requests[token]
+            while window and window[0] <= now - config.rate_window:
+                window.popleft()
+            if len(window) >= config.rate_limit:
+                return max(1, int(window[0] + config.rate_window - now + 0.999))
+            window.append(now)
+            return 0
+
+    def record(self, endpoint, status_code, token, duration, body_size):
+        with self.lock:
+            self.requests[endpoint] += 1
+            self.status_codes[str(status_code)] += 1
+            self.tokens[token] += 1
+            self.durations[endpoint].append(duration)
+            self.bytes_received += body_size
+
+    # Function summary: Returns the request statistics, with latency percentiles per endpoint.
+    def get_stats(self):
+        with self.lock:
+            elapsed = time.time() - self.started
+            return {
+                "elapsed_seconds": round(elapsed, 3),
+                "requests": sum(self.requests.values()),
+                "requests_per_second": round(sum(self.requests.values()) / elapsed, 2) if elapsed else 0,
+                "by_endpoint": {endpoint: {"count": count, **get_percentiles(self.durations[endpoint])} for endpoint, count in self.requests.items()},
+                "status_codes": dict(self.status_codes),
+                "by_token": dict(self.tokens),
+                "bytes_received": self.bytes_received,
+                "annotations_received": self.annotations_received,
+                "annotations_stored": sum(len(annotations) for annotations in self.annotations.values()),
+                "reports": len(self.reports),
+                "statuses": len(self.statuses)
+            }
+
+
+class SimulatorHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    config = None
+    state = None
+
+    def do_GET(self):
+        self.handle_request("GET")
+
+    def do_PUT(self):
+        self.handle_request("PUT")
+
+    def do_POST(self):
+        self.handle_request("POST")
+
+    def do_DELETE(self):
+        self.handle_request("DELETE")
+
+    def handle_request(self, method):
+        start = time.perf_counter()
+        body = self.rfile.read(int(self.headers.get("Content-Length") or 0))
+        token = self.headers.get("Authorization", "").removeprefix("Bearer ") or "anonymous"
+        path = urlparse(self.path).path
+        endpoint, status_code, data, headers = self.route(method, path, body, token)
+        if endpoint is not None:
+            self.state.record(endpoint, status_code, token, time.perf_counter() - start, len(body))
+        self.send_json(status_code, data, headers)
+
+    # Function summary: Applies the simulated conditions, then runs the endpoint. Returns (endpoint, status, body, headers).
+    def route(self, method, path, body, token):
+        if path == "/_stats" and method == "GET":
+            return None, 200, self.state.get_stats(), {}
+        if path == "/_reset" and method == "POST":
+            with self.state.lock:
+                self.state.reset()
+            return None, 200, {}, {}
+
+        match = COMMIT_PATH.match(path)
+        if match is None:
+            return "unknown", 404, {"error": {"message": f"Unknown path {path}"}}, {}
+        commit, rest = match.group(1), (match.group(2) or "/").rstrip("/")
+        endpoint = get_endpoint_name(method, rest)
+
+        self.simulate_latency()
+        retry_after = self.state.check_rate_limit(token, self.config)
+        if retry_after:
+            return endpoint, 429, {"error": {"message": "Rate limit for this resource has been exceeded"}}, {"Retry-After": str(retry_after)}
+        if self.config.random.random() < self.config.throttle_rate:
+            return endpoint, 429, {"error": {"message": "Too many requests"}}, {"Retry-After": str(self.config.retry_after)}
+        if self.config.random.random() < self.config.error_rate:
+            return endpoint, 503, {"error": {"message": "Service unavailable"}}, {}
+
+        try:
+            data = json.loads(body) if body else None
+        except ValueError:
+            return endpoint, 400, {"error": {"message": "Invalid JSON"}}, {}
+        status_code, response = self.run_endpoint(method, commit, rest, data)
+        return endpoint, status_code, response, {}
+
+    def run_endpoint(self, method, commit, rest, data):
+        state = self.state
+        parts = rest.strip("/").split("/") if rest.strip("/") else []
+
+        if not parts and method == "GET":
+            return 200, {"hash": get_full_hash(commit)}
+        if parts == ["statuses", "build"] and method == "POST":
+            with state.lock:
+                state.statuses[(commit, data.get("key"))] = data
+            return 201, data
+        if len(parts) == 2 and parts[0] == "reports":
+            report_key = (commit, unquote(parts[1]))
+            with state.lock:
+                if method == "PUT":
+                    state.reports[report_key] = data
+                    state.annotations.setdefault(report_key, {})
+                    return 200, data
+                if method == "GET" and report_key in state.reports:
+                    return 200, state.reports[report_key]
+                if method == "DELETE" and report_key in state.reports:
+                    del state.reports[report_key]
+                    state.annotations.pop(report_key, None)
+                    return 204, None
+            return 404, {"error": {"message": "Report not found"}}
+        if len(parts) >= 3 and parts[0] == "reports" and parts[2] == "annotations":
+            return self.run_annotations(method, (commit, unquote(parts[1])), parts[3:], data)
+        return 404, {"error": {"message": "Unknown endpoint"}}
+
+    def run_annotations(self, method, report_key, rest, data):
+        state = self.state
+        with state.lock:
+            if report_key not in state.reports:
+                return 404, {"error": {"message": "Report not found"}}
+            stored = state.annotations[report_key]
+
+            if method == "POST" and not rest:
+                if not isinstance(data, list) or len(data) > MAX_ANNOTATIONS_PER_REQUEST:
+                    return 400, {"error": {"message": f"Expected a list of at most {MAX_ANNOTATIONS_PER_REQUEST} annotations"}}
+                new_ids = {annotation.get("external_id") for annotation in data} - stored.keys()
+                if len(stored) + len(new_ids) > MAX_ANNOTATIONS_PER_REPORT:
+                    return 400, {"error": {"message": f"A report can have at most {MAX_ANNOTATIONS_PER_REPORT} annotations"}}
+                for annotation in data:
+                    stored[annotation.get("external_id")] = annotation
+                state.annotations_received += len(data)
+                return 200, data
+            if method == "GET" and not rest:
+                return 200, {"values": list(stored.values()), "size": len(stored)}
+            if method == "DELETE" and len(rest) == 1:
+                if stored.pop(unquote(rest[0]), None) is None:
+                    return 404, {"error": {"message": "Annotation not found"}}
+                return 204, None
+        return 404, {"error": {"message": "Unknown endpoint"}}
+
+    def simulate_latency(self):
+        delay = self.config.latency_ms
+        if self.config.latency_jitter_ms:
+            delay += self.config.random.uniform(-self.config.latency_jitter_ms, self.config.latency_jitter_ms)
+        if delay > 0:
+            time.sleep(delay / 1000)
+
+    def send_json(self, status_code, data, headers):
+        body = json.dumps(data).encode("utf-8") if data is not None else b""
+        self.send_response(status_code)
+        for name, value in headers.items():
+            self.send_header(name, value)
+        if body:
+            self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+# Function summary: Returns a stable full hash for a short one, starting with it like a real commit's would.
+def get_full_hash(short_commit):
+    return (short_commit + hashlib.sha1(short_commit.encode("utf-8")).hexdigest())[:40]
+
+def get_endpoint_name(method, rest):
+    parts = rest.strip("/").split("/") if rest.strip("/") else []
+    if not parts:
+        return f"{method} commit"
+    if parts[0] == "reports":
+        return f"{method} annotations" if len(parts) >= 3 else f"{method} report"
+    return f"{method} {'/'.join(parts)}"
+
+def get_percentiles(durations):
+    if not durations:
+        return {}
+    ordered = sorted(durations)
+    def percentile(share):
+        return round(ordered[min(len(ordered) - 1, int(share * len(ordered)))] * 1000, 2)
+    return {"p50_ms": percentile(0.5), "p95_ms": percentile(0.95), "max_ms": round(ordered[-1] * 1000, 2)}
+
+# Function summary: Starts the simulator in a background thread and returns the server. server.state holds its data and stats.
+def start_simulator(config=None, host="127.0.0.1", port=0):
+    handler = type("ConfiguredSimulatorHandler", (SimulatorHandler,), {"config": config or SimulatorConfig(), "state": SimulatorState()})
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    server.state = handler.state
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+def get_repo_url(server, workspace="simulator", repo="repo"):
+    return f"http://{server.server_address[0]}:{server.server_address[1]}/repositories/{workspace}/{repo}"
+
+def add_config_arguments(parser):
+    parser.add_argument("--latency-ms", type=float, default=0, help="Added latency of every API request.")
+    parser.add_argument("--latency-jitter-ms", type=float, default=0, help="Random variation of the latency, plus or minus.")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Share of requests answered with a 503.")
+    parser.add_argument("--throttle-rate", type=float, default=0.0, help="Share of requests answered with a random 429.")
+    parser.add_argument("--retry-after", type=int, default=1, help="Retry-After seconds of the random 429s.")
+    parser.add_argument("--rate-limit", type=int, default=0, help="Requests allowed per token in each rate window, 0 for no limit.")
+    parser.add_argument("--rate-window", type=float, default=60.0, help="Length of the rate limit window in seconds.")
+    parser.add_argument("--error-seed", type=int, help="Seed of the simulated latency and errors, for repeatable runs.")
+
+def get_config(args):
+    return SimulatorConfig(args["latency_ms"], args["latency_jitter_ms"], args["error_rate"], args["throttle_rate"],
+                           args["retry_after"], args["rate_limit"], args["rate_window"], args["error_seed"])
+
+def main():
+    # Command-line arguments:
+    parser = argparse.ArgumentParser(description="Runs a local Bitbucket API simulator.", formatter_class=argparse.ArgumentDefaultsHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1", help="The address to listen on.")
+    parser.add_argument("--port", type=int, default=8765, help="The port to listen on.")
+    add_config_arguments(parser)
+    args = vars(parser.parse_args())
+
+    server = start_simulator(get_config(args), args["host"], args["port"])
+    print(f"Bitbucket simulator listening, set JOB_REPO={get_repo_url(server)}")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        pass
+    server.shutdown()
+    print(json.dumps(server.state.get_stats(), indent=2))
+    sys.exit(0)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,213 @@
+import os
+import json
+import random
+import argparse
+
+# Generators for synthetic pipeline artifacts at a configurable scale: Unity and Jenkins logs, NUnit results,
+# a coverage summary, dotnet-format and npm audit reports, and a Unity project tree.
+# Every generator streams to disk, so inputs of several GB can be made without holding them in memory,
+# and takes a seed so the same sizes always produce the same files.
+# Usage: python generate_inputs.py <output dir> [--preset small|full]
+
+# Constant variables:
+PRESETS = {
+    "small": {"log_mb": 20, "test_cases": 10000, "lint_changes": 5000, "advisories": 500, "project_files": 10000},
+    "full": {"log_mb": 2048, "test_cases": 100000, "lint_changes": 50000, "advisories": 5000, "project_files": 100000}
+}
+CHANGES_PER_DOCUMENT = 10
+FAILED_RATIO = 0.05
+ERROR_RATIO = 0.0005  # Share of the Unity log lines that match a known error
+
+UNITY_LOG_LINES = [
+    "Refreshing native plugins compatible for Editor in {n:.2f} ms, found {m} plugins.",
+    "[Package Manager] Done resolving packages in {n:.2f} seconds",
+    "Start importing Assets/Scripts/Gameplay/Component{m}.cs using Guid({h}) Importer(MonoImporter)",
+    "UnloadTime: {n:.6f} ms",
+    "Unloading {m} Unused Serialized files (Serialized files now loaded: 0)",
+    "Asset Pipeline Refresh (id={h}): Total: {n:.3f} seconds - Initiated by RefreshV2(NoUpdateAssetOptions)",
+    "  at UnityEditor.BuildPipeline.BuildPlayerInternal (UnityEditor.BuildPlayerOptions options) [0x{m:05x}] in <{h}>:0",
+    "Assets/Scripts/Gameplay/Component{m}.cs(12,7): warning CS0168: The variable 'e' is declared but never used",
+]
+UNITY_ERROR_LINES = [
+    "Assets/Scripts/Gameplay/Component{m}.cs(3,14): error CS0234: The type or namespace name 'Foo' does not exist",
+    "An error occurred while resolving packages:",
+    "Error building Player because scripts have compile errors in the editor",
+]
+SEVERITIES = ["info", "low", "moderate", "high", "critical"]
+
+
+# Function summary: Writes a Unity editor style log of about size_mb megabytes, with a few known errors spread through it.
+def generate_unity_log(path, size_mb, seed=0):
+    rng = random.Random(seed)
+    target = size_mb * 1024 * 1024
+    written = 0
+    with open(path, "w", encoding="utf-8", newline="\n") as log:
+        while written < target:
+            lines = []
+            for _ in range(1000):
+                templates = UNITY_ERROR_LINES if rng.random() < ERROR_RATIO else UNITY_LOG_LINES
+                lines.append(rng.choice(templates).format(n=rng.random() * 1000, m=rng.randrange(100000), h=f"{rng.getrandbits(128):032x}"))
+            block = "\n".join(lines) + "\n"
+            log.write(block)
+            written += len(block)
+    return path
+
+# Function summary: Writes an NUnit results file like Unity's, with test cases spread over nested fixtures.
+def generate_nunit_results(path, test_cases, mode="EditMode", failed_ratio=FAILED_RATIO, seed=0):
+    rng = random.Random(seed)
+    results = ["Failed" if rng.random() < failed_ratio else "Passed" for _ in range(test_cases)]
+    failed = results.count("Failed")
+    with open(path, "w", encoding="utf-8") as xml:
+        xml.write('<?xml version="1.0" encoding="utf-8"?>\n')
+        xml.write(f'<test-run id="2" testcasecount="{test_cases}" result="{"Failed" if failed else "Passed"}" '
+                  f'total="{test_cases}" passed="{test_cases - failed}" failed="{failed}" skipped="0">\n')
+        xml.write(f'  <test-suite type="Assembly" name="{mode}Tests.dll" total="{test_cases}">\n')
+        for index, result in enumerate(results):
+            if index % 100 == 0:
+                if index:
+                    xml.write('    </test-suite>\n')
+                xml.write(f'    <test-suite type="TestFixture" name="Fixture{index // 100}" fullname="{mode}Tests.Fixture{index // 100}">\n')
+            method = f"Test{mode}{index}"
+            xml.write(f'      <test-case id="{index}" name="{method}" fullname="{mode}Tests.Fixture{index // 100}.{method}" '
+                      f'methodname="{method}" result="{result}" duration="{rng.random():.4f}">')
+            if result == "Failed":
+                xml.write(f'<failure><message><![CDATA[Expected: {index} But was: {index + 1}]]></message>'
+                          f'<stack-trace><![CDATA[at {mode}Tests.Fixture{index // 100}.{method} () [0x00001] in Fixture.cs:{index % 500}]]></stack-trace></failure>')
+            xml.write('</test-case>\n')
+        if test_cases:
+            xml.write('    </test-suite>\n')
+        xml.write('  </test-suite>\n</test-run>\n')
+    return path
+
+# Function summary: Writes the code coverage summary read by the test report.
+def generate_coverage_summary(path, line_coverage=75.5):
+    with open(path, "w", encoding="utf-8") as xml:
+        xml.write(f'<?xml version="1.0" encoding="utf-8"?>\n<CoverageReport><Summary><Linecoverage>{line_coverage}</Linecoverage></Summary></CoverageReport>\n')
+    return path
+
+# Function summary: Writes a Unity project tree of file_count files, returning the relative paths of its scripts.
+def generate_project_tree(root, file_count, seed=0):
+    rng = random.Random(seed)
+    scripts = []
+    for index in range(file_count):
+        folder = os.path.join(root, "Assets", rng.choice(["Scripts", "Prefabs", "Materials", "Scenes"]), f"Group{index % 200}")
+        os.makedirs(folder, exist_ok=True)
+        is_script = index % 4 == 0
+        name = f"File{index}.cs" if is_script else f"Asset{index}.asset"
+        with open(os.path.join(folder, name), "w") as f:
+            f.write("// generated\n")
+        if is_script:
+            scripts.append(os.path.relpath(os.path.join(folder, name), root).replace(os.sep, "/"))
+    os.makedirs(os.path.join(root, "ProjectSettings"), exist_ok=True)
+    with open(os.path.join(root, "ProjectSettings", "ProjectVersion.txt"), "w") as f:
+        f.write("m_EditorVersion: 2022.3.10f1\nm_EditorVersionWithRevision: 2022.3.10f1 (ff3792e53c62)\n")
+    return scripts
+
+# Function summary: Writes a dotnet format report with change_count FileChanges spread over the project's scripts.
+def generate_lint_report(path, project_root, scripts, change_count, seed=0):
+    rng = random.Random(seed)
+    with open(path, "w", encoding="utf-8") as report:
+        report.write("[")
+        for index in range(0, change_count, CHANGES_PER_DOCUMENT):
+            script = rng.choice(scripts)
+            document = {
+                "DocumentId": {"Id": f"{rng.getrandbits(128):032x}"},
+                "FileName": os.path.basename(script),
+                "FilePath": os.path.join(project_root, script),
+                "FileChanges": [{
+                    "LineNumber": rng.randrange(1, 800),
+                    "CharNumber": rng.randrange(1, 120),
+                    "DiagnosticId": "WHITESPACE",
+                    "FormatDescription": "Fix whitespace formatting. Replace 1 characters with '\\s'."
+                } for _ in range(min(CHANGES_PER_DOCUMENT, change_count - index))]
+            }
+            report.write(("," if index else "") + json.dumps(document))
+        report.write("]")
+    return path
+
+# Function summary: Writes an npm audit (v2) report with advisory_count advisories over a set of packages.
+def generate_audit_report(path, advisory_count, seed=0):
+    rng = random.Random(seed)
+    vulnerabilities = {}
+    for index in range(advisory_count):
+        package = f"package-{index // 3}"
+        entry = vulnerabilities.setdefault(package, {"name": package, "severity": "low", "isDirect": False, "via": [], "effects": [], "range": "*", "fixAvailable": True})
+        severity = rng.choice(SEVERITIES)
+        entry["via"].append({
+            "source": 100000 + index,
+            "name": package,
+            "dependency": package,
+            "title": f"Prototype pollution in {package} ({index})",
+            "url": f"https://github.com/advisories/GHSA-{index:04d}",
+            "severity": severity,
+            "range": "<2.0.0"
+        })
+        if index % 3 == 0 and index:
+            entry["via"].append(f"package-{index // 3 - 1}")  # A dependency, which has its own entry
+        entry["severity"] = severity
+    with open(path, "w", encoding="utf-8") as report:
+        json.dump({"auditReportVersion": 2, "vulnerabilities": vulnerabilities, "metadata": {"vulnerabilities": {"total": advisory_count}}}, report)
+    return path
+
+# Function summary: Generates every input into output_dir at the given sizes and returns their paths.
+def generate_all(output_dir, sizes, seed=0):
+    os.makedirs(output_dir, exist_ok=True)
+    paths = {}
+
+    report_dir = os.path.join(output_dir, "report")
+    for folder in ["test_results", "coverage_results/Report", "build_project_results"]:
+        os.makedirs(os.path.join(report_dir, folder), exist_ok=True)
+    paths["report_dir"] = report_dir
+    paths["unity_log"] = generate_unity_log(os.path.join(report_dir, "build_project_results", "build_project.log"), sizes["log_mb"], seed)
+    for mode in ["EditMode", "PlayMode"]:
+        generate_nunit_results(os.path.join(report_dir, "test_results", f"{mode}-results.xml"), sizes["test_cases"], mode, seed=seed)
+        generate_unity_log(os.path.join(report_dir, "test_results", f"{mode}-tests.log"), max(1, sizes["log_mb"] // 20), seed)
+    generate_coverage_summary(os.path.join(report_dir, "coverage_results", "Report", "Summary.xml"))
+    paths["jenkins_console"] = generate_unity_log(os.path.join(output_dir, "jenkins-console.txt"), max(1, sizes["log_mb"] // 10), seed + 1)
+
+    project_root = os.path.join(output_dir, "project")
+    scripts = generate_project_tree(project_root, sizes["project_files"], seed)
+    paths["project"] = project_root
+    paths["lint_report"] = generate_lint_report(os.path.join(output_dir, "format-report.json"), project_root, scripts, sizes["lint_changes"], seed)
+    paths["audit_report"] = generate_audit_report(os.path.join(output_dir, "audit-report.json"), sizes["advisories"], seed)
+
+    with open(os.path.join(output_dir, "inputs.json"), "w") as f:
+        json.dump({"sizes": sizes, "seed": seed, "paths": paths}, f, indent=2)
+    return paths
+
+# Function summary: Returns the sizes, seed and paths of earlier generated inputs, or None.
+def read_inputs(inputs_file):
+    try:
+        with open(inputs_file) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+# Function summary: Returns the sizes of a preset with any overrides applied.
+def get_sizes(preset, overrides):
+    sizes = dict(PRESETS[preset])
+    sizes.update({name: value for name, value in overrides.items() if value is not None})
+    return sizes
+
+def add_size_arguments(parser):
+    parser.add_argument("--preset", choices=list(PRESETS), default="small", help="The base input sizes, full is the size of large production builds.")
+    parser.add_argument("--log-mb", type=int, help="Size of the Unity build log in MB.")
+    parser.add_argument("--test-cases", type=int, help="Test cases in each NUnit results file.")
+    parser.add_argument("--lint-changes", type=int, help="FileChanges in the dotnet format report.")
+    parser.add_argument("--advisories", type=int, help="Advisories in the npm audit report.")
+    parser.add_argument("--project-files", type=int, help="Files in the Unity project tree.")
+    parser.add_argument("--seed", type=int, default=0, help="Seed of the generated content.")
+
+def main():
+    # Command-line arguments:
+    parser = argparse.ArgumentParser(description="Generates synthetic pipeline inputs for the benchmarks.", formatter_class=argparse.ArgumentDefaultsHelpFormatter)
+    parser.add_argument("output_dir", help="The folder to write the inputs to.")
+    add_size_arguments(parser)
+    args = vars(parser.parse_args())
+
+    sizes = get_sizes(args["preset"], {name: args[name] for name in PRESETS["small"]})
+    paths = generate_all(args["output_dir"], sizes, args["seed"])
+    print(json.dumps(paths, indent=2))
+
+if __name__ == "__main__":
+    main()
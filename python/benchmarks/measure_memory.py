@@ -0,0 +1,39 @@
+import os
+import sys
+import json
+import runpy
+import tracemalloc
+
+# Runs a pipeline script like "python <script> <args>" would, and writes its peak memory to BENCHMARK_RESULT_FILE.
+# The peak traced by tracemalloc is the script's own Python allocations. The process' max RSS is added where the
+# resource module exists (not on Windows). Worker processes a script starts are not included in either.
+# Usage: python measure_memory.py <script.py> [script arguments...]
+
+def get_max_rss():
+    try:
+        import resource
+    except ImportError:
+        return None
+    max_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return max_rss if sys.platform == "darwin" else max_rss * 1024  # Linux reports KB, macOS bytes
+
+def main():
+    script_path = sys.argv[1]
+    sys.argv = sys.argv[1:]
+    sys.path.insert(0, os.path.dirname(os.path.abspath(script_path)))
+
+    exit_code = 0
+    tracemalloc.start()
+    try:
+        runpy.run_path(script_path, run_name="__main__")
+    except SystemExit as e:
+        exit_code = e.code if isinstance(e.code, int) else (0 if e.code is None else 1)
+    peak_traced = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+
+    with open(os.environ["BENCHMARK_RESULT_FILE"], "w") as f:
+        json.dump({"exit_code": exit_code, "peak_traced_bytes": peak_traced, "max_rss_bytes": get_max_rss()}, f)
+    sys.exit(exit_code)
+
+if __name__ == "__main__":
+    main()
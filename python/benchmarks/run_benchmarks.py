@@ -0,0 +1,239 @@
+import os
+import sys
+import json
+import time
+import shutil
+import platform
+import argparse
+import tempfile
+import statistics
+import subprocess
+import threading
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+import generate_inputs
+
+# Times and memory-profiles the pipeline scripts against generated inputs, with Bitbucket and Jenkins
+# replaced by local stub servers, and writes the results as JSON.
+# Each script is run as its own process, like the pipeline does: several timed runs, then one run under
+# measure_memory.py for the peak memory, since tracing slows the script down.
+# A saved baseline is compared against with --baseline, and any slower or larger result fails the run.
+# Usage: python run_benchmarks.py [--preset small|full] [--save-baseline baseline.json | --baseline baseline.json]
+
+# Constant variables:
+BENCHMARK_DIR = os.path.dirname(os.path.abspath(__file__))
+SCRIPT_DIR = os.path.dirname(BENCHMARK_DIR)
+WORKSPACE = os.path.dirname(SCRIPT_DIR)
+DEFAULT_REPEAT = 3
+DEFAULT_TOLERANCE = 0.25  # A result more than 25% over the baseline is a regression
+COMMIT = "0123456789abcdef0123456789abcdef01234567"
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    # Answers every Bitbucket call with a success, and serves the Jenkins console from the generated file.
+    protocol_version = "HTTP/1.1"
+    console_path = None
+
+    def do_GET(self):
+        if "progressiveText" in self.path or self.path.endswith("consoleText"):
+            self.send_console()
+        else:
+            self.send_json({"hash": COMMIT})
+
+    def do_PUT(self):
+        self.read_body()
+        self.send_json({})
+
+    do_POST = do_PUT
+    do_DELETE = do_PUT
+
+    def read_body(self):
+        length = int(self.headers.get("Content-Length") or 0)
+        if length:
+            self.rfile.read(length)
+
+    def send_json(self, data):
+        body = json.dumps(data).encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def send_console(self):
+        size = os.path.getsize(self.console_path)
+        start = 0
+        if "start=" in self.path:
+            start = min(int(self.path.rsplit("start=", 1)[1].split("&")[0]), size)
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; charset=utf-8")
+        self.send_header("Content-Length", str(size - start))
+        self.send_header("X-Text-Size", str(size))
+        self.end_headers()
+        with open(self.console_path, "rb") as console:
+            console.seek(start)
+            shutil.copyfileobj(console, self.wfile, 1024 * 1024)
+
+    def log_message(self, format, *args):
+        pass
+
+# Function summary: Starts the stub server on a free local port and returns it.
+def start_stub_server(console_path):
+    StubHandler.console_path = console_path
+    server = ThreadingHTTPServer(("127.0.0.1", 0), StubHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+# Function summary: Returns each benchmark's script and arguments.
+def get_benchmarks(paths):
+    return {
+        "get_unity_failure": ("get_unity_failure.py", [paths["unity_log"], "--mode", "counts"]),
+        "create_log_report": ("create_log_report.py", []),
+        "create_bitbucket_test_report": ("create_bitbucket_test_report.py", [COMMIT, paths["report_dir"]]),
+        "linting_error_report": ("linting_error_report.py", [paths["lint_report"], COMMIT, "Fail", paths["project"]]),
+        "npm_audit": ("npm_audit.py", [COMMIT, paths["audit_report"]])
+    }
+
+# Function summary: Returns the environment the scripts get in the pipeline, pointed at the stub server.
+def get_environment(server, paths, cache_dir):
+    port = server.server_address[1]
+    return dict(os.environ,
+                WORKSPACE=WORKSPACE,
+                REPORT_DIR=paths["report_dir"],
+                JOB_REPO=f"http://127.0.0.1:{port}/repositories/benchmark/repo",
+                JOB_NAME="Benchmark/repo",
+                BUILD_URL="http://jenkins/job/Benchmark/job/repo/1/",
+                JENKINS_LOCAL_PORT=str(port),
+                JENKINS_API_KEY="benchmark:token",
+                BITBUCKET_ACCESS_TOKEN="benchmark-token",
+                BITBUCKET_RATE_LIMIT="100000",  # The stub has no rate limit, pacing would only add sleeps
+                TICKET_NUMBER="BENCH-1",
+                FOLDER_NAME="Benchmark",
+                BUILD_ID="1",
+                BUILD_NUMBER="1",
+                PIPELINE_CACHE_DIR=cache_dir,
+                PYTHONIOENCODING="utf-8")
+
+# Function summary: Removes what an earlier run left behind, so every run starts cold.
+def reset_state(paths, cache_dir):
+    shutil.rmtree(cache_dir, ignore_errors=True)
+    for name in ["jenkins-console.log", "jenkins-console.json"]:
+        path = os.path.join(paths["report_dir"], name)
+        if os.path.isfile(path):
+            os.remove(path)
+
+# Function summary: Runs one benchmark repeat times for its timing, then once for its memory, and returns the results.
+def run_benchmark(script, script_args, env, paths, cache_dir, repeat):
+    script_path = os.path.join(SCRIPT_DIR, script)
+    durations = []
+    for _ in range(repeat):
+        reset_state(paths, cache_dir)
+        start = time.perf_counter()
+        result = subprocess.run([sys.executable, script_path] + script_args, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE)
+        durations.append(time.perf_counter() - start)
+        if result.returncode != 0:
+            return {"exit_code": result.returncode, "error": result.stderr.decode("utf-8", errors="replace")[-2000:]}
+
+    reset_state(paths, cache_dir)
+    with tempfile.TemporaryDirectory() as temp_dir:
+        result_file = os.path.join(temp_dir, "memory.json")
+        subprocess.run([sys.executable, os.path.join(BENCHMARK_DIR, "measure_memory.py"), script_path] + script_args,
+                       env=dict(env, BENCHMARK_RESULT_FILE=result_file), stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        with open(result_file) as f:
+            memory = json.load(f)
+
+    return {
+        "exit_code": 0,
+        "seconds_min": round(min(durations), 4),
+        "seconds_median": round(statistics.median(durations), 4),
+        "peak_traced_bytes": memory["peak_traced_bytes"],
+        "max_rss_bytes": memory["max_rss_bytes"]
+    }
+
+# Function summary: Returns the regressions of the results against a baseline, as readable lines.
+def compare_to_baseline(results, baseline, tolerance):
+    regressions = []
+    if baseline.get("sizes") != results["sizes"]:
+        regressions.append(f"Input sizes differ from the baseline ({baseline.get('sizes')}), results are not comparable")
+        return regressions
+
+    for name, result in results["benchmarks"].items():
+        previous = baseline.get("benchmarks", {}).get(name)
+        if previous is None:
+            continue
+        if result["exit_code"] != 0:
+            regressions.append(f"{name}: failed with exit code {result['exit_code']}")
+            continue
+        for metric in ["seconds_median", "peak_traced_bytes", "max_rss_bytes"]:
+            if previous.get(metric) and result.get(metric) and result[metric] > previous[metric] * (1 + tolerance):
+                regressions.append(f"{name}: {metric} {result[metric]} is over the baseline {previous[metric]} by more than {tolerance:.0%}")
+    return regressions
+
+def print_results(results):
+    for name, result in results["benchmarks"].items():
+        if result["exit_code"] != 0:
+            print(f"{name}: FAILED ({result['exit_code']})\n{result['error']}")
+            continue
+        max_rss = f"{result['max_rss_bytes'] / 1024 / 1024:.1f} MB" if result["max_rss_bytes"] else "n/a"
+        print(f"{name}: {result['seconds_median']:.2f}s median ({result['seconds_min']:.2f}s min), "
+              f"peak traced {result['peak_traced_bytes'] / 1024 / 1024:.1f} MB, max RSS {max_rss}")
+
+def main():
+    # Command-line arguments:
+    parser = argparse.ArgumentParser(description="Benchmarks the pipeline scripts against generated inputs.", formatter_class=argparse.ArgumentDefaultsHelpFormatter)
+    generate_inputs.add_size_arguments(parser)
+    parser.add_argument("--inputs-dir", help="Where the inputs are generated, reused if they were generated with the same sizes. Defaults to a temporary folder.")
+    parser.add_argument("--only", nargs="+", help="Only run these benchmarks.")
+    parser.add_argument("--repeat", type=int, default=DEFAULT_REPEAT, help="Timed runs per benchmark.")
+    parser.add_argument("--output", default=os.path.join(BENCHMARK_DIR, "results.json"), help="Where the results are written.")
+    parser.add_argument("--save-baseline", help="Also write the results to this baseline file.")
+    parser.add_argument("--baseline", help="A baseline file to compare the results against.")
+    parser.add_argument("--tolerance", type=float, default=DEFAULT_TOLERANCE, help="How much slower or larger than the baseline a result may be.")
+    args = vars(parser.parse_args())
+
+    sizes = generate_inputs.get_sizes(args["preset"], {name: args[name] for name in generate_inputs.PRESETS["small"]})
+    inputs_dir = args["inputs_dir"] or tempfile.mkdtemp(prefix="pipeline-benchmark-")
+    inputs_file = os.path.join(inputs_dir, "inputs.json")
+    previous_inputs = generate_inputs.read_inputs(inputs_file)
+    if previous_inputs and previous_inputs["sizes"] == sizes and previous_inputs["seed"] == args["seed"]:
+        paths = previous_inputs["paths"]
+    else:
+        print(f"Generating inputs in {inputs_dir}: {sizes}")
+        paths = generate_inputs.generate_all(inputs_dir, sizes, args["seed"])
+
+    server = start_stub_server(paths["jenkins_console"])
+    cache_dir = os.path.join(inputs_dir, "cache")
+    env = get_environment(server, paths, cache_dir)
+
+    results = {
+        "created": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "machine": {"platform": platform.platform(), "python": platform.python_version(), "processor": platform.processor(), "cpus": os.cpu_count()},
+        "sizes": sizes,
+        "benchmarks": {}
+    }
+    for name, (script, script_args) in get_benchmarks(paths).items():
+        if args["only"] and name not in args["only"]:
+            continue
+        print(f"Running {name}...")
+        results["benchmarks"][name] = run_benchmark(script, script_args, env, paths, cache_dir, args["repeat"])
+    server.shutdown()
+
+    print_results(results)
+    for path in [args["output"], args["save_baseline"]]:
+        if path:
+            with open(path, "w") as f:
+                json.dump(results, f, indent=2)
+
+    if args["baseline"]:
+        with open(args["baseline"]) as f:
+            regressions = compare_to_baseline(results, json.load(f), args["tolerance"])
+        for regression in regressions:
+            print(f"REGRESSION {regression}")
+        if regressions:
+            sys.exit(1)
+        print("No regressions against the baseline.")
+
+    if any(result["exit_code"] != 0 for result in results["benchmarks"].values()):
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
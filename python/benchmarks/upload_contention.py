@@ -0,0 +1,114 @@
+import os
+import sys
+import json
+import time
+import shutil
+import hashlib
+import argparse
+import tempfile
+import subprocess
+from concurrent.futures import ThreadPoolExecutor
+import generate_inputs
+import bitbucket_simulator
+
+# Measures end-to-end report upload throughput while dozens of builds upload at once, against the Bitbucket simulator.
+# Every simulated build is its own process of a reporting script with its own commit, like parallel pipeline runs on
+# the agents. Builds share a token unless --tokens is given, so the simulator's per-token rate limit is shared too.
+# Usage: python upload_contention.py [--builds 24] [--script npm_audit|linting_error_report|create_bitbucket_test_report] [--rate-limit 1000 --rate-window 3600]
+
+# Constant variables:
+BENCHMARK_DIR = os.path.dirname(os.path.abspath(__file__))
+SCRIPT_DIR = os.path.dirname(BENCHMARK_DIR)
+WORKSPACE = os.path.dirname(SCRIPT_DIR)
+SCRIPTS = {
+    "npm_audit": lambda commit, paths: ("npm_audit.py", [commit, paths["audit_report"]]),
+    "linting_error_report": lambda commit, paths: ("linting_error_report.py", [paths["lint_report"], commit, "Fail", paths["project"]]),
+    "create_bitbucket_test_report": lambda commit, paths: ("create_bitbucket_test_report.py", [commit, paths["report_dir"]])
+}
+
+
+# Function summary: Returns the environment of one simulated build, pointed at the simulator.
+def get_build_environment(repo_url, paths, build, token, cache_dir):
+    return dict(os.environ,
+                WORKSPACE=WORKSPACE,
+                REPORT_DIR=paths["report_dir"],
+                JOB_REPO=repo_url,
+                JOB_NAME="Contention/repo",
+                BUILD_URL=f"http://jenkins/job/Contention/job/repo/{build}/",
+                BITBUCKET_ACCESS_TOKEN=token,
+                TICKET_NUMBER=f"CONTENTION-{build}",
+                BUILD_ID=str(build),
+                BUILD_NUMBER=str(build),
+                PIPELINE_CACHE_DIR=cache_dir,
+                PIPELINE_DAEMON="0",
+                PYTHONIOENCODING="utf-8")
+
+# Function summary: Runs one simulated build's script and returns its exit code and duration.
+def run_build(script, script_args, env):
+    start = time.perf_counter()
+    result = subprocess.run([sys.executable, os.path.join(SCRIPT_DIR, script)] + script_args, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE)
+    return {"exit_code": result.returncode, "seconds": time.perf_counter() - start, "error": result.stderr.decode("utf-8", errors="replace")[-1000:]}
+
+def main():
+    # Command-line arguments:
+    parser = argparse.ArgumentParser(description="Measures report upload throughput of concurrent builds against the Bitbucket simulator.", formatter_class=argparse.ArgumentDefaultsHelpFormatter)
+    parser.add_argument("--builds", type=int, default=24, help="Builds uploading at the same time.")
+    parser.add_argument("--script", choices=list(SCRIPTS), default="npm_audit", help="The reporting script every build runs.")
+    parser.add_argument("--tokens", type=int, default=1, help="Access tokens the builds are spread over.")
+    parser.add_argument("--inputs-dir", help="Where the inputs are generated. Defaults to a temporary folder.")
+    parser.add_argument("--output", help="Also write the results to this JSON file.")
+    generate_inputs.add_size_arguments(parser)
+    bitbucket_simulator.add_config_arguments(parser)
+    args = vars(parser.parse_args())
+
+    sizes = generate_inputs.get_sizes(args["preset"], {name: args[name] for name in generate_inputs.PRESETS["small"]})
+    inputs_dir = args["inputs_dir"] or tempfile.mkdtemp(prefix="pipeline-contention-")
+    previous_inputs = generate_inputs.read_inputs(os.path.join(inputs_dir, "inputs.json"))
+    if previous_inputs and previous_inputs["sizes"] == sizes and previous_inputs["seed"] == args["seed"]:
+        paths = previous_inputs["paths"]
+    else:
+        print(f"Generating inputs in {inputs_dir}: {sizes}")
+        paths = generate_inputs.generate_all(inputs_dir, sizes, args["seed"])
+
+    server = bitbucket_simulator.start_simulator(bitbucket_simulator.get_config(args))
+    repo_url = bitbucket_simulator.get_repo_url(server)
+    cache_dir = os.path.join(inputs_dir, "cache")
+    shutil.rmtree(cache_dir, ignore_errors=True)  # No cooldown or snapshots left over from an earlier run
+    builds = []
+    for build in range(1, args["builds"] + 1):
+        commit = hashlib.sha1(f"build-{build}".encode("utf-8")).hexdigest()
+        script, script_args = SCRIPTS[args["script"]](commit, paths)
+        # One cache folder for every build, like the builds on one agent, so they share the Retry-After cooldown
+        env = get_build_environment(repo_url, paths, build, f"contention-token-{build % args['tokens']}", cache_dir)
+        builds.append((script, script_args, env))
+
+    print(f"Running {len(builds)} concurrent {args['script']} builds against {repo_url}...")
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=len(builds)) as executor:
+        results = list(executor.map(lambda build: run_build(*build), builds))
+    elapsed = time.perf_counter() - start
+    stats = server.state.get_stats()
+    server.shutdown()
+
+    failed = [result for result in results if result["exit_code"] != 0]
+    durations = sorted(result["seconds"] for result in results)
+    summary = {
+        "builds": len(results),
+        "failed_builds": len(failed),
+        "wall_seconds": round(elapsed, 3),
+        "build_seconds_median": round(durations[len(durations) // 2], 3),
+        "build_seconds_max": round(durations[-1], 3),
+        "annotations_per_second": round(stats["annotations_received"] / elapsed, 2),
+        "simulator": stats
+    }
+    print(json.dumps(summary, indent=2))
+    for result in failed[:3]:
+        print(f"Build failed with exit code {result['exit_code']}:\n{result['error']}")
+    if args["output"]:
+        with open(args["output"], "w") as f:
+            json.dump(summary, f, indent=2)
+    if failed:
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,216 @@
+import os
+import json
+import urllib.parse
+import requests
+import threading
+import request_scheduler
+import tracing
+from concurrent.futures import ThreadPoolExecutor
+from requests.adapters import HTTPAdapter
+
+# Optional dependency: orjson serializes the annotation batches faster when it is installed.
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+# Shared Bitbucket Cloud API client used by every reporting script.
+# All requests go through one keep-alive session, so a script that sends a report and several
+# annotation batches reuses the same pooled connection instead of a new TCP/TLS handshake per call.
+# Every call goes through the shared request scheduler, which paces the calls and retries rate limited
+# and failed ones. Annotation batches and build statuses are keyed (external_id, key), so they are safe to resend.
+
+# Constant variables:
+POOL_SIZE = 10  # Max pooled connections kept open per host
+
+# Limits according to Bitbucket REST API docs
+MAX_ANNOTATIONS = 1000  # The total max number of annotations allowed per report
+BATCH_SIZE = 100        # Limit of annotations per request
+
+# Max annotation batches in flight at once, can be overridden with BITBUCKET_UPLOAD_WORKERS
+DEFAULT_UPLOAD_WORKERS = 4
+
+ERROR_BODY_PREVIEW = 500  # Characters of a failed request's body that are printed
+
+# Global variables:
+_session = None
+_session_lock = threading.Lock()
+_scheduler = None
+
+
+# Function summary: Builds the headers needed by the Bitbucket Cloud API for the given access token.
+def get_headers(access_token):
+    return {
+        "Accept": "application/json",
+        "Content-Type": "application/json",
+        "Authorization": "Bearer " + access_token
+    }
+
+# Function summary: Returns the shared session, creating it the first time it is needed.
+# The auth header is refreshed on every call so a changed BITBUCKET_ACCESS_TOKEN is always picked up.
+def get_session():
+    global _session
+
+    with _session_lock:
+        if _session is None:
+            _session = requests.Session()
+            adapter = HTTPAdapter(pool_connections=1, pool_maxsize=POOL_SIZE)
+            _session.mount("https://", adapter)
+            _session.mount("http://", adapter)
+
+    access_token = os.getenv('BITBUCKET_ACCESS_TOKEN') or ""
+    _session.headers.update(get_headers(access_token))
+    return _session
+
+# Function summary: Returns the shared request scheduler, creating it the first time it is needed.
+def get_scheduler():
+    global _scheduler
+
+    with _session_lock:
+        if _scheduler is None:
+            _scheduler = request_scheduler.RequestScheduler(get_session)
+    return _scheduler
+
+# Function summary: Prints what happened to the script's API calls, then starts counting afresh for the next script.
+def print_delivery_summary():
+    stats = get_scheduler().stats
+    stats.print_summary()
+    stats.reset()
+
+# Function summary: Prints the failed request body and the API's error response, if there is one.
+def print_request_error(e, prefix="Initial Request"):
+    if e.request is not None:
+        body = e.request.body
+        if isinstance(body, bytes):
+            body = body[:ERROR_BODY_PREVIEW].decode("utf-8", errors="replace")
+        elif body is not None:
+            body = body[:ERROR_BODY_PREVIEW]
+        print(f"{prefix}: {body}")
+    if e.response is not None:
+        try:
+            print(f"Response Error: {json.dumps(e.response.json())}")
+        except ValueError:
+            print(f"Response Error: {e.response.status_code} {e.response.text}")
+    else:
+        print(f"General Exception: {e}")
+
+# Function summary: Creates or replaces a report on a commit. Raises requests.RequestException on failure.
+def put_report(url, report):
+    return get_scheduler().request("PUT", url, data=json.dumps(report))
+
+# Function summary: Serializes a batch of annotations.Annotation objects straight to the request body bytes.
+def serialize_batch(annotation_batch):
+    data = [annotation.to_dict() for annotation in annotation_batch]
+    body = orjson.dumps(data) if orjson is not None else json.dumps(data, separators=(",", ":")).encode("utf-8")
+    tracing.count("bytes_sent", len(body))
+    return body
+
+# Function summary: Sends one batch of annotations to a report. Raises requests.RequestException on failure.
+# The batch is serialized once, and retries send the same bytes.
+def post_annotations(url, annotation_batch):
+    return get_scheduler().request("POST", url, idempotent=True, data=serialize_batch(annotation_batch))
+
+# Function summary: Sends a build status to a commit. Raises requests.RequestException on failure.
+def post_build_status(url, build_status, max_retries=None):
+    return get_scheduler().request("POST", url, idempotent=True, max_retries=max_retries, data=json.dumps(build_status))
+
+# Function summary: Deletes one annotation from a report by its external id. Raises requests.RequestException on failure.
+def delete_annotation(url, external_id):
+    return get_scheduler().request("DELETE", f"{url}/{urllib.parse.quote(external_id, safe='')}")
+
+# Function summary: Retrieves JSON data from the API, such as a commit's full hash. Raises requests.RequestException on failure.
+def get_json(url):
+    return get_scheduler().request("GET", url).json()
+
+# Function summary: Returns the external ids of every annotation on a report, following the API's pages.
+# Raises requests.RequestException on failure.
+def get_annotation_ids(url):
+    external_ids = set()
+    page_url = f"{url}?pagelen={BATCH_SIZE}"
+    while page_url:
+        page = get_json(page_url)
+        external_ids.update(annotation.get("external_id") for annotation in page.get("values", []))
+        page_url = page.get("next")
+    return external_ids
+
+# Function summary: This function takes the total annotations, and a batch size then slices the list
+# According to the batch size yield returning the chunk and repeating
+def chunk_annotations(annotations, batch_size):
+    for i in range(0, len(annotations), batch_size):
+        yield annotations[i:i + batch_size] # List slices ie 0:100, 100:200, yield can return multiple times
+
+# Function summary: Returns how many annotation batches may be sent at the same time.
+# The value is capped by the connection pool size so no worker ever waits for a free connection.
+def get_upload_workers(max_workers=None):
+    if max_workers is None:
+        max_workers = int(os.getenv('BITBUCKET_UPLOAD_WORKERS', DEFAULT_UPLOAD_WORKERS))
+    return max(1, min(max_workers, POOL_SIZE))
+
+# Function summary: Sends one numbered batch and returns its result instead of raising,
+# so one failed batch does not stop the others.
+def _send_batch(url, idx, annotation_batch):
+    try:
+        post_annotations(url, annotation_batch)
+        return {"batch": idx + 1, "size": len(annotation_batch), "sent": True}
+    except requests.exceptions.RequestException as e:
+        print_request_error(e, f"Error with batch {idx + 1}")
+        return {"batch": idx + 1, "size": len(annotation_batch), "sent": False, "error": str(e)}
+
+# Function summary: Sends up to MAX_ANNOTATIONS annotations to a report in batches of BATCH_SIZE,
+# with up to max_workers batches in flight at once. Prints a per-batch summary and returns the batch results.
+def upload_annotations(url, annotations, max_workers=None):
+    # Only send up to 1000 annotations, Slices excess off limit of REST API
+    annotations_to_send = annotations[:MAX_ANNOTATIONS]
+    batches = list(chunk_annotations(annotations_to_send, BATCH_SIZE))
+    if not batches:
+        return []
+
+    workers = min(get_upload_workers(max_workers), len(batches))
+    with tracing.span("upload_annotations", annotations=len(annotations_to_send), batches=len(batches), workers=workers):
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            futures = [executor.submit(_send_batch, url, idx, batch) for idx, batch in enumerate(batches)]
+            results = [future.result() for future in futures]
+    tracing.count("annotations_sent", sum(result["size"] for result in results if result["sent"]))
+
+    print_upload_summary(results, len(annotations))
+    return results
+
+# Function summary: Deletes the annotations with the given external ids, up to max_workers at once.
+# Returns the ids that are gone from the report, including ones that were already missing.
+def delete_annotations(url, external_ids, max_workers=None):
+    if not external_ids:
+        return []
+
+    def delete(external_id):
+        try:
+            delete_annotation(url, external_id)
+            return external_id
+        except requests.exceptions.RequestException as e:
+            if e.response is not None and e.response.status_code == 404:
+                return external_id
+            print_request_error(e, f"Error deleting annotation {external_id}")
+            return None
+
+    workers = min(get_upload_workers(max_workers), len(external_ids))
+    with tracing.span("delete_annotations", annotations=len(external_ids), workers=workers):
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            deleted = [external_id for external_id in executor.map(delete, external_ids) if external_id is not None]
+    tracing.count("annotations_deleted", len(deleted))
+
+    print(f"Deleted {len(deleted)}/{len(external_ids)} resolved annotations")
+    return deleted
+
+# Function summary: Prints which batches were sent or failed, and how many annotations were over the limit.
+def print_upload_summary(results, total_annotations):
+    sent = [result for result in results if result["sent"]]
+    failed = [result for result in results if not result["sent"]]
+
+    for result in results:
+        status = "sent successfully" if result["sent"] else f"failed ({result['error']})"
+        print(f"Batch {result['batch']} ({result['size']} annotations) {status}")
+
+    print(f"Annotation upload summary: {len(sent)}/{len(results)} batches sent, "
+          f"{sum(result['size'] for result in sent)} annotations delivered, "
+          f"{sum(result['size'] for result in failed)} failed")
+    if total_annotations > MAX_ANNOTATIONS:
+        print(f"{total_annotations - MAX_ANNOTATIONS} annotations were not sent, over the {MAX_ANNOTATIONS} annotation limit")
@@ -0,0 +1,189 @@
+import os
+import sys
+import time
+import hashlib
+import argparse
+import requests
+import bitbucket_client
+import cache_utils
+
+# Local queue for Bitbucket build statuses, so the pipeline never waits on the API to report a state.
+# Each (status url, key) pair has one file in the queue folder, and a newer state simply replaces it,
+# so a burst of transitions for the same build ends up as a single POST of the last state.
+# Statuses are queued per access token, and a detached drainer process per token sends them and
+# retries failed ones with exponential backoff.
+# Usage: python build_status_queue.py drain | flush [--timeout N]
+
+# Constant variables:
+QUEUE_NAME = "build-status-queue"
+MAX_ATTEMPTS = 6
+BACKOFF_BASE = 2      # Seconds before the first retry, doubled on each attempt
+BACKOFF_MAX = 60
+DRAINER_STALE_AFTER = 120  # The drainer touches its lock at least this often while it runs
+IDLE_POLL = 0.5       # Seconds a drainer waits for more statuses before it exits
+FLUSH_TIMEOUT = 30
+
+
+# Function summary: Returns the queue folder of the current access token, shared by every build on the agent that uses it.
+# A drainer sends with the token of its own environment, so each token gets its own queue and drainer, and a status
+# is never sent with another job's credential.
+def get_queue_dir():
+    token_hash = hashlib.sha1((os.getenv('BITBUCKET_ACCESS_TOKEN') or "").encode("utf-8")).hexdigest()[:16]
+    return cache_utils.get_cache_dir(os.path.join(QUEUE_NAME, token_hash))
+
+def get_entry_path(url, key):
+    entry_id = hashlib.sha1(f"{url}|{key}".encode("utf-8")).hexdigest()
+    return os.path.join(get_queue_dir(), f"{entry_id}.json")
+
+def get_drainer_lock():
+    return os.path.join(get_queue_dir(), "drainer")
+
+# Function summary: Queues a build status. A state still waiting for the same url and key is replaced, last state wins.
+def enqueue(url, build_status):
+    entry_path = get_entry_path(url, build_status["key"])
+    with cache_utils.file_lock(entry_path):
+        cache_utils.write_json_atomic(entry_path, {
+            "url": url,
+            "status": build_status,
+            "attempts": 0,
+            "next_attempt": 0
+        })
+
+# Function summary: Returns the queued entries as (path, entry) pairs.
+def list_entries():
+    queue_dir = get_queue_dir()
+    entries = []
+    for name in os.listdir(queue_dir):
+        if not name.endswith(".json"):
+            continue
+        path = os.path.join(queue_dir, name)
+        entry = cache_utils.read_json(path)
+        if entry is not None:
+            entries.append((path, entry))
+    return entries
+
+# Function summary: Returns whether a failed POST is worth retrying. Rejected statuses (other 4xx errors) never will succeed.
+def is_retryable(error):
+    response = getattr(error, "response", None)
+    if response is None:
+        return True  # Connection errors and timeouts
+    return response.status_code == 429 or response.status_code >= 500
+
+# Function summary: Sends one queued entry and then removes it, or reschedules it with backoff if the POST can be retried.
+# The POST runs without holding the entry's lock so enqueueing never waits on the API. If a newer state replaced
+# the entry in the meantime, the newer state is left in the queue and sent next.
+def send_entry(path, entry):
+    status = entry["status"]
+    try:
+        # The queue does the retrying, so one failing status never holds up the others behind it
+        bitbucket_client.post_build_status(entry["url"], status, max_retries=0)
+        print(f"Sent build status {status['state']} for {entry['url']}")
+        update_entry(path, entry, None)
+    except requests.exceptions.RequestException as e:
+        attempts = entry["attempts"] + 1
+        if not is_retryable(e) or attempts >= MAX_ATTEMPTS:
+            bitbucket_client.print_request_error(e, prefix=f"Build status {status['state']} dropped after {attempts} attempt(s)")
+            update_entry(path, entry, None)
+            return
+
+        delay = min(BACKOFF_MAX, BACKOFF_BASE * 2 ** (attempts - 1))
+        print(f"Build status {status['state']} failed ({e}), retrying in {delay}s")
+        update_entry(path, entry, dict(entry, attempts=attempts, next_attempt=time.time() + delay))
+
+# Function summary: Replaces a sent entry with new_entry, or removes it when new_entry is None,
+# unless it has been replaced by a newer state since it was read.
+def update_entry(path, entry, new_entry):
+    with cache_utils.file_lock(path):
+        if cache_utils.read_json(path) != entry:
+            return
+        if new_entry is None:
+            os.remove(path)
+        else:
+            cache_utils.write_json_atomic(path, new_entry)
+
+# Function summary: Sends queued statuses until the queue is empty. Only one drainer runs per agent.
+# Returns False if another drainer already holds the queue.
+def drain():
+    lock_path = get_drainer_lock()
+    drained = False
+    while True:
+        try:
+            with cache_utils.file_lock(lock_path, timeout=0, stale_after=DRAINER_STALE_AFTER):
+                drain_queue(f"{lock_path}.lock")
+        except TimeoutError:
+            return drained
+        drained = True
+        # A status queued while this drainer was exiting saw the lock and started no drainer of its own
+        if not list_entries():
+            return True
+
+def drain_queue(lock_file):
+    idle_since = None
+    while True:
+        os.utime(lock_file)  # Keeps the lock from looking stale while retries are waiting
+        now = time.time()
+        entries = list_entries()
+        due = [(path, entry) for path, entry in entries if entry["next_attempt"] <= now]
+
+        for path, entry in due:
+            send_entry(path, entry)
+
+        if due:
+            idle_since = None
+            continue
+        if entries:
+            wait = min(entry["next_attempt"] for path, entry in entries) - now
+            time.sleep(min(max(wait, 0), BACKOFF_MAX))
+            continue
+
+        # Empty, but give statuses queued right behind the last one a moment before exiting
+        idle_since = idle_since or now
+        if now - idle_since >= IDLE_POLL:
+            return
+        time.sleep(IDLE_POLL / 5)
+
+# Function summary: Starts a detached drainer that keeps running after the pipeline step has finished.
+def start_drainer():
+    import subprocess
+    options = {"stdin": subprocess.DEVNULL, "stdout": subprocess.DEVNULL, "stderr": subprocess.DEVNULL, "close_fds": True}
+    if os.name == "nt":
+        options["creationflags"] = subprocess.DETACHED_PROCESS | subprocess.CREATE_NEW_PROCESS_GROUP
+    else:
+        options["start_new_session"] = True
+    # Jenkins kills processes a step leaves behind unless they opt out with this cookie
+    env = dict(os.environ, JENKINS_NODE_COOKIE="dontKillMe")
+    try:
+        subprocess.Popen([sys.executable, os.path.abspath(__file__), "drain"], env=env, **options)
+    except OSError as e:
+        sys.stderr.write(f"Could not start the build status drainer: {e}\n")
+
+# Function summary: Starts a drainer unless one is already running.
+def ensure_drainer():
+    if not os.path.exists(f"{get_drainer_lock()}.lock"):
+        start_drainer()
+
+# Function summary: Waits until every queued status is sent or dropped, starting a drainer if none is running.
+# Returns False if statuses are still queued, for a later retry, after the timeout.
+def flush(timeout=FLUSH_TIMEOUT):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if not list_entries():
+            return True
+        ensure_drainer()
+        time.sleep(IDLE_POLL)
+    return not list_entries()
+
+def main():
+    # Command-line arguments:
+    parser = argparse.ArgumentParser(description="Sends the queued Bitbucket build statuses.", formatter_class=argparse.ArgumentDefaultsHelpFormatter)
+    parser.add_argument("command", choices=["drain", "flush"], help="drain sends the queue in this process, flush waits for it to be sent.")
+    parser.add_argument("-t", "--timeout", type=float, default=FLUSH_TIMEOUT, help="Seconds flush waits before giving up.")
+    args = vars(parser.parse_args())
+
+    if args["command"] == "drain":
+        drain()
+    elif not flush(args["timeout"]):
+        print(f"Build statuses are still queued after {args['timeout']}s, the drainer keeps retrying them.")
+
+if __name__ == "__main__":
+    main()
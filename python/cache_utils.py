@@ -0,0 +1,61 @@
+import os
+import json
+import time
+import contextlib
+
+# Helpers for the small on-disk caches the pipeline scripts keep between builds.
+# Caches live under PIPELINE_CACHE_DIR, or ~/.cache/jenkins-pipeline when it is not set,
+# so every job on an agent shares them.
+
+
+# Function summary: Returns the folder for one named cache, creating it if needed.
+def get_cache_dir(name):
+    base_dir = os.getenv('PIPELINE_CACHE_DIR') or os.path.join(os.path.expanduser("~"), ".cache", "jenkins-pipeline")
+    cache_dir = os.path.join(base_dir, name)
+    os.makedirs(cache_dir, exist_ok=True)
+    return cache_dir
+
+# Function summary: Loads a cached JSON file, or returns None if it is missing or unreadable.
+def read_json(path):
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+# Function summary: Writes a JSON file atomically, so a reader never sees a half-written cache.
+def write_json_atomic(path, data):
+    temp_path = f"{path}.{os.getpid()}.tmp"
+    with open(temp_path, 'w', encoding='utf-8') as f:
+        json.dump(data, f, separators=(",", ":"))
+    os.replace(temp_path, path)
+
+# Function summary: Holds an exclusive lock file while the block runs, so parallel executors on the same agent
+# take turns updating a cache. A lock older than stale_after seconds is left over from a killed build and is taken over.
+@contextlib.contextmanager
+def file_lock(path, timeout=10, stale_after=60):
+    lock_path = f"{path}.lock"
+    deadline = time.monotonic() + timeout
+    while True:
+        try:
+            fd = os.open(lock_path, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+            break
+        except FileExistsError:
+            try:
+                if time.time() - os.path.getmtime(lock_path) > stale_after:
+                    os.remove(lock_path)
+                    continue
+            except OSError:
+                continue # Released in the meantime
+            if time.monotonic() > deadline:
+                raise TimeoutError(f"Timed out waiting for the cache lock: {lock_path}")
+            time.sleep(0.05)
+
+    try:
+        os.close(fd)
+        yield
+    finally:
+        try:
+            os.remove(lock_path)
+        except OSError:
+            pass
@@ -0,0 +1,72 @@
+import os
+import sys
+import hashlib
+import subprocess
+import cache_utils
+
+# Resolves a short commit hash to the full hash without the Bitbucket API when possible.
+# The local clone is asked first, then a small on-disk cache of earlier API answers, one per repository.
+# The cache keeps the most recently used entries and is only changed under a lock, since parallel
+# executors on the same agent share it.
+
+# Constant variables:
+CACHE_NAME = "commit-hashes"
+MAX_ENTRIES = 500
+
+
+# Function summary: Returns the full hash of the short commit from the local clone, or None if the clone does not have it.
+def get_local_commit(repo_dir, short_commit):
+    if not repo_dir or not os.path.isdir(repo_dir):
+        return None
+    try:
+        result = subprocess.run(["git", "-C", repo_dir, "rev-parse", "--verify", "--quiet", f"{short_commit}^{{commit}}"],
+                                capture_output=True, text=True)
+    except OSError:
+        return None
+
+    full_hash = result.stdout.strip()
+    # A branch or tag could have the same name as the short hash, only a hash starting with it is an answer
+    if result.returncode != 0 or not full_hash.startswith(short_commit.lower()):
+        return None
+    return full_hash
+
+# Function summary: Returns the path of the repository's cache file.
+def get_cache_file(repo_url):
+    cache_key = hashlib.sha1(repo_url.encode("utf-8")).hexdigest()[:12]
+    return os.path.join(cache_utils.get_cache_dir(CACHE_NAME), f"{cache_key}.json")
+
+# Function summary: Returns the cached full hash of the short commit, or None. A hit is marked as the most recently used entry.
+def lookup(repo_url, short_commit):
+    cache_file = get_cache_file(repo_url)
+    entries = cache_utils.read_json(cache_file)
+    if not isinstance(entries, dict) or short_commit not in entries:
+        return None
+
+    try:
+        with cache_utils.file_lock(cache_file):
+            entries = cache_utils.read_json(cache_file) or {}
+            full_hash = entries.pop(short_commit, None)
+            if full_hash is None:
+                return None
+            entries[short_commit] = full_hash # dicts keep insertion order, so the last entry is the most recent
+            cache_utils.write_json_atomic(cache_file, entries)
+    except TimeoutError:
+        pass # The answer is still good, the entry just keeps its old place
+
+    return entries.get(short_commit)
+
+# Function summary: Adds a resolved hash to the cache, evicting the least recently used entries past MAX_ENTRIES.
+def store(repo_url, short_commit, full_hash):
+    cache_file = get_cache_file(repo_url)
+    try:
+        with cache_utils.file_lock(cache_file):
+            entries = cache_utils.read_json(cache_file)
+            if not isinstance(entries, dict):
+                entries = {}
+            entries.pop(short_commit, None)
+            entries[short_commit] = full_hash
+            for old_commit in list(entries)[:max(0, len(entries) - MAX_ENTRIES)]:
+                del entries[old_commit]
+            cache_utils.write_json_atomic(cache_file, entries)
+    except (TimeoutError, OSError) as e:
+        print(f"Could not update the commit hash cache: {e}", file=sys.stderr)
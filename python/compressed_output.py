@@ -0,0 +1,108 @@
+import os
+import gzip
+
+# Optional dependency: brotli is only needed for the .br variants.
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+# Writes report files together with precompressed variants, so a web server set up for it can serve the
+# .gz/.br file directly and send far fewer bytes to the browser.
+# The compressed variants are produced while the text is written, so the file is never re-read.
+
+# Constant variables:
+DEFAULT_LEVEL = 6  # Used for both gzip (1-9) and brotli quality (0-11)
+
+
+class CompressionStats:
+    # Totals of the bytes written for each variant, across every file written with the same stats object.
+    def __init__(self):
+        self.files = 0
+        self.raw_bytes = 0
+        self.gzip_bytes = 0
+        self.brotli_bytes = 0
+
+    def add(self, raw_bytes, gzip_bytes, brotli_bytes):
+        self.files += 1
+        self.raw_bytes += raw_bytes
+        self.gzip_bytes += gzip_bytes
+        self.brotli_bytes += brotli_bytes
+
+    # Function summary: Prints the sizes and compression ratios of everything written.
+    def print_summary(self):
+        print(f"Compressed {self.files} report files: {format_size(self.raw_bytes)} uncompressed")
+        print(f" - gzip: {format_size(self.gzip_bytes)} ({format_ratio(self.raw_bytes, self.gzip_bytes)})")
+        if self.brotli_bytes:
+            print(f" - brotli: {format_size(self.brotli_bytes)} ({format_ratio(self.raw_bytes, self.brotli_bytes)})")
+
+
+class CompressedTextWriter:
+    # A text file that also writes <path>.gz, and <path>.br when brotli is enabled, with the same content.
+    def __init__(self, path, level=DEFAULT_LEVEL, use_brotli=False, stats=None):
+        self.path = path
+        self.stats = stats
+        self.raw_bytes = 0
+        self.raw_file = open(path, mode="wb")
+        # mtime=0 keeps the .gz file identical for identical content
+        self.gzip_file = gzip.GzipFile(f"{path}.gz", mode="wb", compresslevel=level, mtime=0)
+        self.brotli_file = None
+        self.brotli_compressor = None
+        if use_brotli and brotli is not None:
+            self.brotli_file = open(f"{path}.br", mode="wb")
+            self.brotli_compressor = brotli.Compressor(quality=level)
+
+    def write(self, text):
+        data = text.encode("utf-8")
+        self.raw_bytes += len(data)
+        self.raw_file.write(data)
+        self.gzip_file.write(data)
+        if self.brotli_compressor is not None:
+            self.brotli_file.write(self.brotli_compressor.process(data))
+        return len(text)
+
+    def close(self):
+        if self.raw_file.closed:
+            return
+        self.raw_file.close()
+        self.gzip_file.close()
+        if self.brotli_compressor is not None:
+            self.brotli_file.write(self.brotli_compressor.finish())
+            self.brotli_file.close()
+
+        if self.stats is not None:
+            brotli_bytes = os.path.getsize(f"{self.path}.br") if self.brotli_file is not None else 0
+            self.stats.add(self.raw_bytes, os.path.getsize(f"{self.path}.gz"), brotli_bytes)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+
+# Function summary: Opens a text file for writing, with compressed variants unless level is None.
+# Variants left by an earlier run that will not be rewritten are removed so they never go stale.
+def open_text(path, level=DEFAULT_LEVEL, use_brotli=False, stats=None):
+    if level is None or not use_brotli or brotli is None:
+        remove_variant(f"{path}.br")
+    if level is None:
+        remove_variant(f"{path}.gz")
+        return open(path, mode="w", encoding="utf-8")
+    return CompressedTextWriter(path, level, use_brotli, stats)
+
+def remove_variant(path):
+    if os.path.isfile(path):
+        os.remove(path)
+
+def format_size(size):
+    for unit in ["B", "KB", "MB"]:
+        if size < 1024:
+            return f"{size:.1f} {unit}"
+        size /= 1024
+    return f"{size:.1f} GB"
+
+def format_ratio(raw_bytes, compressed_bytes):
+    if not compressed_bytes:
+        return "n/a"
+    return f"{raw_bytes / compressed_bytes:.1f}x smaller"
@@ -1,153 +1,137 @@
 import os
 import sys
+import time
 import requests
-import json
-import xml.etree.ElementTree as ET
 import argparse
+import contextlib
+import bitbucket_client
+import test_results_parser
+import annotation_snapshot
+import annotations as bitbucket_annotations
+import tracing
 
-# Command-line arguments: 
-parser = argparse.ArgumentParser(description="Arguments for Bitbucket test reports.", formatter_class=argparse.ArgumentDefaultsHelpFormatter)
-
-parser.add_argument("commit", help="The commit hash the report will be sent to.")
-parser.add_argument("test-results-path", help="The path in the Jenkins workspace where the test results are located.")
-
-args = vars(parser.parse_args())
-
-# Environment variables:
-access_token = os.getenv('BITBUCKET_ACCESS_TOKEN')
-ticket_number = os.getenv('TICKET_NUMBER')
-pr_repo = os.getenv('JOB_REPO')
-folder_name = os.getenv('FOLDER_NAME')
-
-# Global variables:
-url = f'{pr_repo}/commit/{args["commit"]}/reports/Test-report'
-
-headers = {
-    "Accept": "application/json",
-    "Content-Type": "application/json",
-    "Authorization": "Bearer " + access_token
-}
-
-# Parses the number of tests failed from the results XML file.
-def get_number_of_tests_failed(result_file):
-    tree_root = ET.parse(result_file).getroot()
-    total_tests = tree_root.attrib['total']
-    total_failed = tree_root.attrib['failed']
-    results = {
-        "total_tests": total_tests,
-        "total_failed": total_failed
-    }
-    return results
+# The report is built in three stages: every result source is parsed (in parallel for large files),
+# then the report and annotations are built, then everything is uploaded. Each stage's time is logged.
 
 results_file_name = "Summary.xml"
+mode = ["PlayMode", "EditMode"]
 
-# Parses the line coverage percentage from the code coverage HTML report.
-def get_line_coverage(result_file):
-    tree_root = ET.parse(result_file).getroot()
-    line_coverage = tree_root.find('Summary').find('Linecoverage').text
-    return line_coverage
-
-result = get_line_coverage(f'{args["test-results-path"]}/coverage_results/Report/{results_file_name}')
-result_float = float(result)
-
-# Request variables:
-editmode_failed = get_number_of_tests_failed(f'{args["test-results-path"]}/test_results/EditMode-results.xml')
-playmode_failed = get_number_of_tests_failed(f'{args["test-results-path"]}/test_results/PlayMode-results.xml')
-
-# Sending the report to Bitbucket Cloud API.
-report = json.dumps( {
-    "title": f"{ticket_number}: Consolidated Test Report",
-    "details": f"EditMode: {editmode_failed['total_failed']}/{editmode_failed['total_tests']} failed, "
-               f"PlayMode: {playmode_failed['total_failed']}/{playmode_failed['total_tests']} failed",
-    "report_type": "TEST",
-    "reporter": "Jenkins",
-    "result": "FAILED" if int(editmode_failed['total_failed']) > 0 or int(playmode_failed['total_failed']) > 0 else "PASSED",
-    "link": f"https://webdlx.vconestoga.com/{folder_name}/Reports/{ticket_number}/CodeCoverage-report/index.html",
-    "data": [
-        {
-            "type": "BOOLEAN",
-            "title": "All EditMode tests passed?",
-            "value": int(editmode_failed['total_failed']) == 0
-        },
-        {
-            "type": "BOOLEAN",
-            "title": "All PlayMode tests passed?",
-            "value": int(playmode_failed['total_failed']) == 0
-        },
-        {
-            "type": "PERCENTAGE",
-            "title": "Line coverage",
-            "value": result_float
-        }
-    ]
-} )
-
-try:
-    response = requests.put(url, data=report, headers=headers)
-    response.raise_for_status()
-except requests.exceptions.RequestException as e:
-    print(f"Initial Request: {e.request.body}")
-    print(f"Response Error: {json.dumps(e.response.json())}")
-    exit(1)
-
-# Function summary: This function takes the total annotations, and a batch size then slices the list
-# According to the batch size yield returning the chunk and repeating
-def chunk_annotations(annotations, batch_size):
-    for i in range(0, len(annotations), batch_size):
-        yield annotations[i:i + batch_size] # List slices ie 0:100, 100:200, yield can return multiple times
 
-mode = ["PlayMode", "EditMode"]
+# Function summary: Logs how long the wrapped stage took, and records it as a span of the run's trace.
+@contextlib.contextmanager
+def timed_stage(stage_name):
+    start = time.perf_counter()
+    try:
+        with tracing.span(stage_name):
+            yield
+    finally:
+        print(f"Stage '{stage_name}' took {time.perf_counter() - start:.2f}s")
+
+# Function summary: Parses the EditMode and PlayMode results and the coverage summary.
+def parse_results(test_results_path):
+    return test_results_parser.parse_all({
+        "EditMode": (test_results_parser.parse_test_results, f'{test_results_path}/test_results/EditMode-results.xml'),
+        "PlayMode": (test_results_parser.parse_test_results, f'{test_results_path}/test_results/PlayMode-results.xml'),
+        "coverage": (test_results_parser.get_line_coverage, f'{test_results_path}/coverage_results/Report/{results_file_name}')
+    })
+
+# Function summary: Builds the Bitbucket report from the parsed results.
+def build_report(parsed, ticket_number, folder_name):
+    editmode_failed = parsed["EditMode"]
+    playmode_failed = parsed["PlayMode"]
+    result_float = float(parsed["coverage"])
+
+    return {
+        "title": f"{ticket_number}: Consolidated Test Report",
+        "details": f"EditMode: {editmode_failed['total_failed']}/{editmode_failed['total_tests']} failed, "
+                   f"PlayMode: {playmode_failed['total_failed']}/{playmode_failed['total_tests']} failed",
+        "report_type": "TEST",
+        "reporter": "Jenkins",
+        "result": "FAILED" if int(editmode_failed['total_failed']) > 0 or int(playmode_failed['total_failed']) > 0 else "PASSED",
+        "link": f"https://webdlx.vconestoga.com/{folder_name}/Reports/{ticket_number}/CodeCoverage-report/index.html",
+        "data": [
+            {
+                "type": "BOOLEAN",
+                "title": "All EditMode tests passed?",
+                "value": int(editmode_failed['total_failed']) == 0
+            },
+            {
+                "type": "BOOLEAN",
+                "title": "All PlayMode tests passed?",
+                "value": int(playmode_failed['total_failed']) == 0
+            },
+            {
+                "type": "PERCENTAGE",
+                "title": "Line coverage",
+                "value": result_float
+            }
+        ]
+    }
+
+# Function summary: Builds the annotations for one test mode's failed tests, at most the annotation limit.
+def build_annotations(test_results):
+    selector = bitbucket_annotations.AnnotationSelector()
+
+    # Loop to build json array from the failed tests collected while parsing
+    for id in test_results["failed_tests"]:
+        summary = f"The test method {id} has failed."
+        selector.offer(lambda: bitbucket_annotations.Annotation(
+                external_id=id,
+                annotation_type="VULNERABILITY",
+                summary=summary,
+                result="FAILED",
+                severity="HIGH"
+            ), "HIGH")
+
+    selector.print_dropped_summary()
+    return selector.select()
+
+def main():
+    # Command-line arguments:
+    parser = argparse.ArgumentParser(description="Arguments for Bitbucket test reports.", formatter_class=argparse.ArgumentDefaultsHelpFormatter)
 
-for testmode in mode:
-    # Variables
-    testXML = f'{args["test-results-path"]}/test_results/{testmode}-results.xml'
-    tree = ET.parse(testXML)
-    root = tree.getroot()
-    annotations = []
-
-
-    # Loop to build json array 
-    for test in root.iter('test-case'):
-        if(test.get('result') == "Failed"):
-            id = test.get('methodname')
-            summary = f"The test method {id} has failed."
-            annotation = {
-                    "external_id": id,
-                    "annotation_type": "VULNERABILITY",
-                    "summary": summary,
-                    "result": "FAILED",
-                    "severity": "HIGH"
-                }
-            
-            annotations.append(annotation)
-
-    # Limits according to Bitbucket REST API docs
-    max_annotations = 1000  # The total max number of annotations allowed per report
-    batch_size = 100        # Limit of annotations per request
-
-    # Request stuff below here
-    AnnotationUrl = url + f'/annotations'
-    # Can re use headers
-    # Only send up to 1000 annotations, Slices excess off limit of REST API
-    annotations_to_send = annotations[:max_annotations]
-
-    # Loop through the chunks and send requests
-    for idx, annotation_batch in enumerate(chunk_annotations(annotations_to_send, batch_size)):
-        # Create the JSON body for this batch
-        AnnotationReport = json.dumps(annotation_batch)
-
-        
-        # Send the request
+    parser.add_argument("commit", help="The commit hash the report will be sent to.")
+    parser.add_argument("test-results-path", help="The path in the Jenkins workspace where the test results are located.")
+    parser.add_argument("--incremental", action='store_true', help="Only upload annotations that changed since the last upload to this commit's report, and delete resolved ones.")
+
+    args = vars(parser.parse_args())
+
+    # Environment variables:
+    ticket_number = os.getenv('TICKET_NUMBER')
+    pr_repo = os.getenv('JOB_REPO')
+    folder_name = os.getenv('FOLDER_NAME')
+
+    # Global variables:
+    url = f'{pr_repo}/commit/{args["commit"]}/reports/Test-report'
+
+    with timed_stage("parse"):
+        parsed = parse_results(args["test-results-path"])
+
+    with timed_stage("build"):
+        report = build_report(parsed, ticket_number, folder_name)
+        annotations = {testmode: build_annotations(parsed[testmode]) for testmode in mode}
+
+    with timed_stage("upload"):
+        # Sending the report to Bitbucket Cloud API.
         try:
-            response = requests.post(AnnotationUrl, data=AnnotationReport, headers=headers)
-            response.raise_for_status()  # This will raise an exception for HTTP errors
-            print(f"Batch {idx+1} sent successfully") # Remove later for debugging
+            bitbucket_client.put_report(url, report)
         except requests.exceptions.RequestException as e:
-            print(f"Error with batch {idx+1}: {e.request.body}")
-            if e.response:
-                print(f"Response Error: {json.dumps(e.response.json())}")
+            bitbucket_client.print_request_error(e)
+            bitbucket_client.print_delivery_summary()
+            exit(1)
+
+        # Request stuff below here
+        AnnotationUrl = url + f'/annotations'
+        for testmode in mode:
+            # Sends the batches concurrently, only up to the 1000 annotation limit of the REST API
+            print(f"Sending {testmode} annotations")
+            if args["incremental"]:
+                annotation_snapshot.upload_changed(AnnotationUrl, annotations[testmode], f"{pr_repo}|{ticket_number}", f"Test-report-{testmode}", args["commit"])
             else:
-                print(f"General Exception: {e}")
-            exit(0)  # Exit on error
+                bitbucket_client.upload_annotations(AnnotationUrl, annotations[testmode])
+
+    bitbucket_client.print_delivery_summary()
 
-            
\ No newline at end of file
+# The guard keeps worker processes of the parsing pool from running the script again.
+if __name__ == "__main__":
+    main()
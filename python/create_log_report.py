@@ -4,7 +4,23 @@ import requests
 import sys
 from jinja2 import Environment, FileSystemLoader
 from urllib.parse import urlparse
+import log_pages
+import log_index
+import log_scanner
+import log_folding
+import compressed_output
+import jenkins_console
+import tracing
+from functools import partial
 
+# Command-line arguments:
+parser = argparse.ArgumentParser(description="Arguments for creating the pipeline's log report.", formatter_class=argparse.ArgumentDefaultsHelpFormatter)
+parser.add_argument("-p", "--page-size", type=int, default=log_pages.DEFAULT_PAGE_SIZE, help="Lines per log page loaded by the viewer. Use 0 to put every line into logs.html itself.")
+parser.add_argument("-l", "--compression-level", type=int, default=compressed_output.DEFAULT_LEVEL, help="The gzip level (1-9), also used as the brotli quality, of the precompressed report files.")
+parser.add_argument("--no-compression", action='store_true', help="Only write the uncompressed report files.")
+parser.add_argument("--no-folding", action='store_true', help="Write every log line as it is, instead of folding repeated lines and stack traces.")
+parser.add_argument("--brotli", action='store_true', help="Also write .br variants of the report files. Requires the brotli package.")
+args = vars(parser.parse_args())
 
 #Environment variables:
 jenkins_token = os.getenv('JENKINS_API_KEY')
@@ -15,43 +31,76 @@ workspace = os.getenv('WORKSPACE')
 
 #Global variables
 user_pass = jenkins_token.split(":")
+render_buffer_size = 64  # Number of rendered template pieces joined before each write to the report
 
 # Localhost and port configuration
 local_host_ip = "127.0.0.1"
-local_host_port = "80"
+local_host_port = os.getenv('JENKINS_LOCAL_PORT', "80")
 
 # Parse the existing build_url
 parsed_url = urlparse(build_url)
 
-# Reconstruct the build_url to use localhost and port 80
+# Reconstruct the build_url to use localhost and the JENKINS_LOCAL_PORT port (80 by default)
 local_build_url = f"http://{local_host_ip}:{local_host_port}{parsed_url.path}"
 
 
+# Function summary: Lazily yields the lines of a log, so only the line being rendered is held in memory.
+# Yields nothing if the log does not exist.
 def get_log_lines(path):
-    log = []
     if (os.path.isfile(path)):
-        with open(path, 'r') as test_log:
-            log = test_log.readlines()
-        
-    return log
+        with open(path, 'r', encoding='utf-8', errors='replace') as test_log:
+            for line in test_log:
+                yield line
 
-editmode_log = get_log_lines(f"{working_dir}/test_results/EditMode-tests.log")
-playmode_log = get_log_lines(f"{working_dir}/test_results/PlayMode-tests.log")
-unity_build_log = get_log_lines(f"{working_dir}/build_project_results/build_project.log")
+# The console is streamed to a local copy, and a refresh during the build only downloads what is new since the last one.
+# If Jenkins cannot be reached the report is still written, with the Unity logs and an empty console.
+try:
+    jenkins_console_path = jenkins_console.fetch_console(local_build_url, (user_pass[0], user_pass[1]), working_dir)
+except requests.RequestException as e:
+    print(f"Could not download the Jenkins console, the report will not include it: {e}")
+    jenkins_console_path = ""
 
-jenkins_log = requests.get(f"{local_build_url}consoleText", auth=(user_pass[0], user_pass[1]))
+log_paths = {
+    "jenkins": jenkins_console_path,
+    "editmode": f"{working_dir}/test_results/EditMode-tests.log",
+    "playmode": f"{working_dir}/test_results/PlayMode-tests.log",
+    "build": f"{working_dir}/build_project_results/build_project.log"
+}
 
 environment = Environment(loader=FileSystemLoader(f"{workspace}/python/log-template/"))
 template = environment.get_template("logs.html")
 
+# Every report file is written with .gz (and optionally .br) variants so the web server can serve them precompressed.
+if args["brotli"] and compressed_output.brotli is None:
+    print("The brotli package is not installed, only .gz variants will be written.")
+compression_stats = compressed_output.CompressionStats()
+compression_level = None if args["no_compression"] else args["compression_level"]
+open_report_file = partial(compressed_output.open_text, level=compression_level, use_brotli=args["brotli"], stats=compression_stats)
+
 logs_file = f"{working_dir}/logs.html"
-content = template.render(
-    ticket=ticket,
-    jenkins=jenkins_log.iter_lines(),
-    editMode=editmode_log,
-    playMode=playmode_log,
-    build=unity_build_log
-)
-
-with open(logs_file, mode="w+", encoding="utf-8") as logs:
-    logs.write(content)
\ No newline at end of file
+if args["page_size"] > 0:
+    # Splits each log into pages the viewer loads on demand, logs.html itself only holds the page index.
+    # The same pass indexes each log's known errors, exceptions and stack traces for the viewer's jump list.
+    errors_file = f"{workspace}/logErrors.txt"
+    matcher = log_scanner.compile_patterns(log_scanner.load_patterns(errors_file)) if os.path.isfile(errors_file) else None
+    index = {name: log_pages.write_log_pages(log_index.read_raw_lines(path), working_dir, name, args["page_size"], open_report_file, log_index.LogIndexer(matcher), not args["no_folding"])
+             for name, path in log_paths.items()}
+    index_json = log_pages.write_index(working_dir, index, args["page_size"], open_report_file)
+    content = template.stream(ticket=ticket, index=index_json.replace("</", "<\\/"))
+else:
+    # Streams the rendered template straight to the file instead of building the whole page in memory.
+    # Each log is rendered line by line as it is folded, the template only writes the rendered lines out.
+    content = template.stream(
+        ticket=ticket,
+        jenkins=log_folding.render_lines(get_log_lines(log_paths["jenkins"]), "jenkins", not args["no_folding"]),
+        editMode=log_folding.render_lines(get_log_lines(log_paths["editmode"]), "editmode", not args["no_folding"]),
+        playMode=log_folding.render_lines(get_log_lines(log_paths["playmode"]), "playmode", not args["no_folding"]),
+        build=log_folding.render_lines(get_log_lines(log_paths["build"]), "build", not args["no_folding"])
+    )
+content.enable_buffering(render_buffer_size)
+
+with tracing.span("render_logs_html"), open_report_file(logs_file) as logs_output:
+    content.dump(logs_output)
+
+if compression_level is not None:
+    compression_stats.print_summary()
@@ -0,0 +1,71 @@
+import os
+import hashlib
+import subprocess
+import cache_utils
+import tracing
+
+# Index of every file in a project by file name, built with a single os.scandir walk.
+# Looking a file up is then a dict access instead of a full os.walk of the project per file.
+# The index can be cached on disk, keyed by the project's path and current commit.
+
+# Constant variables:
+SKIPPED_DIRS = {".git"}
+CACHE_NAME = "path-index"
+
+
+# Function summary: Walks the project once and maps each file name to its relative path(s), using "/" separators.
+# Folders are visited top-down in the same order as os.walk, so the first path of a name is the one os.walk finds first.
+@tracing.traced()
+def build_path_index(search_path):
+    index = {}
+    pending = [""]
+    while pending:
+        relative_dir = pending.pop()
+        sub_dirs = []
+        with os.scandir(os.path.join(search_path, relative_dir)) as entries:
+            for entry in entries:
+                relative_path = f"{relative_dir}/{entry.name}" if relative_dir else entry.name
+                if entry.is_dir(follow_symlinks=False):
+                    if entry.name not in SKIPPED_DIRS:
+                        sub_dirs.append(relative_path)
+                elif entry.is_file():
+                    index.setdefault(entry.name, []).append(relative_path)
+        pending.extend(reversed(sub_dirs))
+    return index
+
+# Function summary: Returns the commit the project is checked out at, or None if it is not a git repository.
+def get_project_commit(search_path):
+    try:
+        result = subprocess.run(["git", "-C", search_path, "rev-parse", "HEAD"], capture_output=True, text=True)
+    except OSError:
+        return None
+    return result.stdout.strip() if result.returncode == 0 else None
+
+# Function summary: Returns the project's path index, from the disk cache when use_cache is set and the commit matches.
+def load_path_index(search_path, use_cache=False):
+    commit = get_project_commit(search_path) if use_cache else None
+    if commit is None:
+        return build_path_index(search_path)
+
+    cache_key = hashlib.sha1(f"{os.path.abspath(search_path)}|{commit}".encode("utf-8")).hexdigest()
+    cache_file = os.path.join(cache_utils.get_cache_dir(CACHE_NAME), f"{cache_key}.json")
+    with tracing.span("read_path_index_cache") as attributes:
+        index = cache_utils.read_json(cache_file)
+        attributes["hit"] = index is not None
+    if index is None:
+        index = build_path_index(search_path)
+        cache_utils.write_json_atomic(cache_file, index)
+    return index
+
+# Function summary: Returns the relative path of a file name, or None if the project has no such file.
+# When several files share the name, the one whose path ends the report's full path is chosen.
+def resolve_path(index, filename, full_path=None):
+    candidates = index.get(filename)
+    if not candidates:
+        return None
+    if len(candidates) > 1 and full_path:
+        normalized = "/" + full_path.replace("\\", "/").lstrip("/")
+        for candidate in candidates:
+            if normalized.endswith("/" + candidate):
+                return candidate
+    return candidates[0]
@@ -1,34 +1,37 @@
 import os
 import sys
 import requests
-import json
 import argparse
+import bitbucket_client
+import commit_hash_cache
+
+# The full hash comes from the local clone when it has the commit, then from the on-disk cache,
+# and only on a miss from the Bitbucket API.
 
 # Command-line arguments:
 parser = argparse.ArgumentParser(description="Arguments for retrieving a full commit hash from Bitbucket.", formatter_class=argparse.ArgumentDefaultsHelpFormatter)
 parser.add_argument("pr-commit", help="The short hash for the PR's commit.")
+parser.add_argument("--repo-dir", default=None, help="A local clone of the repository, checked for the commit before the API.")
 args = vars(parser.parse_args())
 
 pr_commit = args["pr-commit"]
 
 # Environment variables:
-access_token = os.getenv('BITBUCKET_ACCESS_TOKEN')
 pr_repo = os.getenv('JOB_REPO')
 
 # Global variables:
 url = f'{pr_repo}/commit/{pr_commit}/?fields=hash'
 
-headers = {
-    "Accept": "application/json",
-    "Authorization": "Bearer " + access_token
-}
+full_hash = commit_hash_cache.get_local_commit(args["repo_dir"], pr_commit) or commit_hash_cache.lookup(pr_repo, pr_commit)
+if full_hash:
+    sys.stdout.write(full_hash)
+    sys.exit(0)
 
 # Retrieving the commit data from Bitbucket Cloud API.
 try:
-    response = requests.get(url, headers=headers)
-    response.raise_for_status()  # Raise an error for bad status codes
-    response_data = response.json()
+    response_data = bitbucket_client.get_json(url)  # Raises an error for bad status codes
     if "hash" in response_data:
+        commit_hash_cache.store(pr_repo, pr_commit, response_data["hash"])
         sys.stdout.write(response_data["hash"])
     else:
         sys.stderr.write("Error: 'hash' key not found in response.\n")
@@ -1,27 +1,34 @@
 import os
 import sys
 import argparse
+import log_scanner
+import tracing
 
 # Command-line arguments:
 parser = argparse.ArgumentParser(description="Arguments for parsing a build's error logs", formatter_class=argparse.ArgumentDefaultsHelpFormatter)
 parser.add_argument("log", help="The path to the log to parse.")
+parser.add_argument("-m", "--mode", choices=['first', 'all', 'counts'], default='first', help="Return the first matching line, every matching line with its line number, or the number of matches per known error.")
+parser.add_argument("-e", "--errors-file", help="The file of known errors to look for. Defaults to logErrors.txt in the workspace.")
 args = vars(parser.parse_args())
 
 #Environment variables:
 workspace = os.getenv('WORKSPACE')
 
 #Global variables:
-errors = []
-found_error = ""
+errors_file = args["errors_file"] if (args["errors_file"] != None) else f'{workspace}/logErrors.txt'
+errors = log_scanner.load_patterns(errors_file)
+matcher = log_scanner.compile_patterns(errors)
 
-with open(f'{workspace}/logErrors.txt', 'r') as error_file:
-    errors = error_file.readlines()
-
-with open(args["log"], 'r') as log_file:
-    log_lines = log_file.readlines()
-    for line in log_lines:
-        if any(error in line for error in errors):
-            found_error = line
-            break
-
-sys.stdout.write(found_error)
\ No newline at end of file
+# Printing out the requested matches so the pipeline can retrieve them.
+with tracing.span("scan_log", mode=args["mode"]):
+    match args["mode"]:
+        case "first":
+            found_error = log_scanner.find_first_match(args["log"], matcher)
+            if found_error:
+                sys.stdout.write(f"{found_error['text']}\n")
+        case "all":
+            for found_error in log_scanner.iter_matches(args["log"], matcher):
+                sys.stdout.write(f"{found_error['line']}: {found_error['text']}\n")
+        case "counts":
+            for error, count in log_scanner.count_matches(args["log"], errors, matcher).items():
+                sys.stdout.write(f"{count}\t{error}\n")
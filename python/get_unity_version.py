@@ -1,27 +1,64 @@
 import os
 import sys
+import json
+import hashlib
 import argparse
+import cache_utils
+
+# The version and revision are cached per project, keyed by ProjectVersion.txt's modification time and size,
+# so the file is only parsed again when it changes. "all" returns every value from one call.
 
 # Constant variables:
 VERSION_INDEX = 1
 REVISION_INDEX = 2
+CACHE_NAME = "unity-projects"
+
+
+# Function summary: Parses the version and revision from the project's ProjectVersion.txt.
+def parse_project_version(project_version_path):
+    with open(project_version_path, 'r') as version_file:
+        version_string = version_file.readlines()[1]
+
+    version_array = version_string.split()
+    return {
+        "version": version_array[VERSION_INDEX],
+        "revision": version_array[REVISION_INDEX].strip("()")
+    }
+
+# Function summary: Returns the version and revision, from the cache when ProjectVersion.txt has not changed since.
+def get_project_version(project_version_path):
+    stat = os.stat(project_version_path)
+    cache_key = hashlib.sha1(os.path.abspath(project_version_path).encode("utf-8")).hexdigest()
+    cache_file = os.path.join(cache_utils.get_cache_dir(CACHE_NAME), f"{cache_key}.json")
+
+    cached = cache_utils.read_json(cache_file)
+    if isinstance(cached, dict) and cached.get("mtime_ns") == stat.st_mtime_ns and cached.get("size") == stat.st_size:
+        return cached["project"]
+
+    project = parse_project_version(project_version_path)
+    try:
+        cache_utils.write_json_atomic(cache_file, {"mtime_ns": stat.st_mtime_ns, "size": stat.st_size, "project": project})
+    except OSError:
+        pass  # Parsed again next time
+    return project
+
+def get_executable_path(version):
+    return f"C:/Program Files/Unity/Hub/Editor/{version}/Editor/Unity.exe"
+
 
 # Command-line arguments:
 parser = argparse.ArgumentParser(description="Arguments for the project's Unity version.", formatter_class=argparse.ArgumentDefaultsHelpFormatter)
 parser.add_argument("project-path", help="The path to the Unity project.")
-parser.add_argument("value", choices=['version', 'revision', 'executable-path'], help="Whether to return the version number, the revision/changeset number, or the Unity executable path.")
+parser.add_argument("value", choices=['version', 'revision', 'executable-path', 'all'], help="Whether to return the version number, the revision/changeset number, the Unity executable path, or all of them and whether that editor is installed.")
+parser.add_argument("-f", "--format", choices=['json', 'env'], default='json', help="The output format of 'all', a JSON object or key=value lines.")
 args = vars(parser.parse_args())
 
 # Global variables:
 project_version_path = f'{args["project-path"]}/ProjectSettings/ProjectVersion.txt'
 
-# Parsing the version and revision.
-with open(project_version_path, 'r') as version_file:
-    version_string = version_file.readlines()[1]
-
-version_array = version_string.split()
-version = version_array[VERSION_INDEX]
-revision = version_array[REVISION_INDEX].strip("()")
+project = get_project_version(project_version_path)
+version = project["version"]
+revision = project["revision"]
 
 # Printing out the requested value so the pipeline can retrieve it.
 match args["value"]:
@@ -30,4 +67,17 @@ match args["value"]:
     case "revision":
         sys.stdout.write(f"{revision}")
     case "executable-path":
-        sys.stdout.write(f"C:/Program Files/Unity/Hub/Editor/{version}/Editor/Unity.exe")
\ No newline at end of file
+        sys.stdout.write(get_executable_path(version))
+    case "all":
+        executable_path = get_executable_path(version)
+        values = {
+            "version": version,
+            "revision": revision,
+            "executable_path": executable_path,
+            # A single stat, checked every time since the pipeline installs missing editors
+            "installed": os.path.isfile(executable_path)
+        }
+        if args["format"] == "json":
+            sys.stdout.write(json.dumps(values))
+        else:
+            sys.stdout.write("\n".join(f"{key}={str(value).lower() if isinstance(value, bool) else value}" for key, value in values.items()))
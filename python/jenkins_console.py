@@ -0,0 +1,59 @@
+import os
+import requests
+import cache_utils
+import tracing
+
+# Downloads a build's Jenkins console into a local file, streaming it in bounded chunks.
+# Jenkins' progressiveText endpoint returns the console from a byte offset, so when the report is
+# refreshed during a long build only the part written since the last download is fetched.
+# Jenkins' offset points into its raw log, which still has the console notes the plain text leaves out, so
+# it is kept next to the local copy together with the copy's own length. A copy of another build is started over.
+
+# Constant variables:
+CONSOLE_FILE = "jenkins-console.log"
+STATE_FILE = "jenkins-console.json"
+CHUNK_SIZE = 64 * 1024
+REQUEST_TIMEOUT = 60
+
+
+# Function summary: Brings the local copy of the build's console up to date and returns its path.
+# Raises requests.RequestException if Jenkins cannot be reached.
+def fetch_console(build_url, auth, report_dir, chunk_size=CHUNK_SIZE):
+    console_path = os.path.join(report_dir, CONSOLE_FILE)
+    state_path = os.path.join(report_dir, STATE_FILE)
+
+    state = cache_utils.read_json(state_path)
+    start = 0   # Offset in Jenkins' raw log
+    length = 0  # Length of the local copy it corresponds to
+    if (isinstance(state, dict) and state.get("build_url") == build_url and isinstance(state.get("offset"), int)
+            and os.path.isfile(console_path) and state.get("length", 0) <= os.path.getsize(console_path)):
+        start, length = state["offset"], state.get("length", 0)
+
+    with tracing.span("fetch_console", start=start) as attributes:
+        try:
+            offset, length = download(f"{build_url}logText/progressiveText?start={start}", console_path, length, auth, chunk_size)
+        except requests.exceptions.HTTPError as e:
+            if e.response is None or e.response.status_code != 404:
+                raise
+            # No progressive log, fall back to the whole console
+            attributes["fallback"] = True
+            offset, length = download(f"{build_url}consoleText", console_path, 0, auth, chunk_size)
+        attributes.update(offset=offset, length=length)
+
+    cache_utils.write_json_atomic(state_path, {"build_url": build_url, "offset": offset, "length": length})
+    return console_path
+
+# Function summary: Streams a console request into the local copy, appending at length, and returns
+# Jenkins' offset to continue from (None if it did not send one) and the new length of the local copy.
+def download(url, console_path, length, auth, chunk_size):
+    with requests.get(url, auth=auth, stream=True, timeout=REQUEST_TIMEOUT) as response:
+        response.raise_for_status()
+        with open(console_path, "r+b" if length and os.path.isfile(console_path) else "wb") as console_file:
+            console_file.seek(length)
+            console_file.truncate()  # Drops anything past the copy's length, such as a half written earlier download
+            for chunk in response.iter_content(chunk_size=chunk_size):
+                console_file.write(chunk)
+            written = console_file.tell()
+
+        text_size = response.headers.get("X-Text-Size")
+        return (int(text_size) if text_size and text_size.isdigit() else None), written
@@ -0,0 +1,136 @@
+import json
+import tracing
+
+# Incremental JSON reader for large reports.
+# Instead of loading the whole document with json.load, the file is read in chunks and the
+# members of one array or object are decoded one at a time, each with the C JSON decoder.
+# Only the member being decoded is held in memory, however large the report is.
+
+# Constant variables:
+CHUNK_SIZE = 64 * 1024  # Characters read from the file at a time
+WHITESPACE = " \t\n\r"
+NUMBER_CHARACTERS = set("0123456789+-.eE")
+
+
+class JsonStreamReader:
+    # Buffered reader over a JSON text file that decodes one value at a time.
+    def __init__(self, file, chunk_size=CHUNK_SIZE):
+        self.file = file
+        self.chunk_size = chunk_size
+        self.buffer = ""
+        self.position = 0
+        self.eof = False
+        self.decoder = json.JSONDecoder()
+
+    # Function summary: Appends at least min_size more characters to the buffer. Returns False at the end of the file.
+    def read_more(self, min_size=0):
+        if self.eof:
+            return False
+        # Drop what has already been consumed so the buffer never grows with the file
+        self.buffer = self.buffer[self.position:]
+        self.position = 0
+        data = self.file.read(max(self.chunk_size, min_size))
+        if not data:
+            self.eof = True
+            return False
+        self.buffer += data
+        tracing.count("json_characters_read", len(data))
+        return True
+
+    # Function summary: Skips whitespace and returns the next character without consuming it, or "" at the end of the file.
+    def peek(self):
+        while True:
+            while self.position < len(self.buffer) and self.buffer[self.position] in WHITESPACE:
+                self.position += 1
+            if self.position < len(self.buffer):
+                return self.buffer[self.position]
+            if not self.read_more():
+                return ""
+
+    def expect(self, characters):
+        character = self.peek()
+        if character == "" or character not in characters:
+            raise ValueError(f"Expected one of '{characters}' in the JSON report but found '{character or 'end of file'}'")
+        self.position += 1
+        return character
+
+    # Function summary: Decodes the next complete JSON value, reading more of the file until it is complete.
+    def decode_value(self):
+        self.peek()
+        read_size = self.chunk_size
+        while True:
+            try:
+                value, end = self.decoder.raw_decode(self.buffer, self.position)
+                if self.eof or not self.may_continue(value, end):
+                    self.position = end
+                    return value
+            except json.JSONDecodeError:
+                if self.eof:
+                    raise
+            if not self.read_more(read_size):
+                continue  # End of file reached, decode once more and let it fail or succeed for good
+            read_size *= 2  # Values larger than a chunk are retried with growing reads, not once per chunk
+
+    # Function summary: Checks whether a decoded number could still continue in the next chunk,
+    # which is the case until a character that cannot be part of a number has been read after it.
+    def may_continue(self, value, end):
+        if end == len(self.buffer):
+            return True
+        if isinstance(value, bool) or not isinstance(value, (int, float)):
+            return False
+        return all(character in NUMBER_CHARACTERS for character in self.buffer[end:])
+
+    # Function summary: Yields each element of the array that starts at the current position.
+    def iter_array(self):
+        self.expect("[")
+        if self.peek() == "]":
+            self.position += 1
+            return
+        while True:
+            yield self.decode_value()
+            if self.expect(",]") == "]":
+                return
+
+    # Function summary: Yields each (key, value) member of the object that starts at the current position.
+    # The value is only decoded when include_value returns True for its key, otherwise the reader stops before it.
+    def iter_object(self, include_value=lambda key: True):
+        self.expect("{")
+        if self.peek() == "}":
+            self.position += 1
+            return
+        while True:
+            key = self.decode_value()
+            self.expect(":")
+            if include_value(key):
+                yield key, self.decode_value()
+            else:
+                yield key, None
+            if self.expect(",}") == "}":
+                return
+
+
+# Function summary: Yields the elements of a file's top-level JSON array one at a time.
+def iter_array(path):
+    with open(path, 'r', encoding='utf-8-sig') as f:  # utf-8-sig also accepts a BOM
+        yield from JsonStreamReader(f).iter_array()
+
+# Function summary: Yields the (key, value) members of the object found under key_path in a file's top-level JSON object.
+# Nothing is yielded if the key path does not exist. Members outside the key path are decoded and dropped one at a time.
+def iter_object_items(path, key_path=()):
+    with open(path, 'r', encoding='utf-8-sig') as f:  # utf-8-sig also accepts a BOM
+        reader = JsonStreamReader(f)
+        yield from _iter_nested_object(reader, list(key_path))
+
+def _iter_nested_object(reader, key_path):
+    if not key_path:
+        yield from reader.iter_object()
+        return
+
+    wanted_key = key_path[0]
+    for key, value in reader.iter_object(include_value=lambda key: key != wanted_key):
+        if key != wanted_key:
+            continue
+        if reader.peek() != "{":
+            reader.decode_value()  # Not an object, so there is nothing to iterate
+            continue
+        yield from _iter_nested_object(reader, key_path[1:])
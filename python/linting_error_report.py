@@ -1,51 +1,91 @@
-import json
 import sys
 import os
 import argparse
 import requests
-import uuid
-
-# Function summary: This takes a file path to a json file, normalizes it and returns the loaded JSON data
+import bitbucket_client
+import file_path_index
+import annotation_snapshot
+import annotations as bitbucket_annotations
+import json_stream
+import tracing
+
+# Function summary: This takes a file path to a json file, normalizes it and returns an iterator over the report's documents
+# The report is streamed, so only one document is held in memory at a time
 def get_json_normalized(json_file):
     normalizedPath = os.path.normpath(json_file)
 
     if not os.path.isfile(normalizedPath):
         raise FileNotFoundError(f"File not found: {normalizedPath}")
 
-    # Load file
-    with open(normalizedPath, 'r') as f:
-        data = json.load(f)
-
-    return data
+    return json_stream.iter_array(normalizedPath)
 
-# Function summary: This function takes a JSON file/file path, and will build the string 
+# Function summary: This function takes the error counts, and will build the string
 # That is included in the report details on bitbucket
-def count_errors(json_file):
-    data = get_json_normalized(json_file)
+def build_error_details(total_errors, file_error_count):
+    # Build string to return
+    retstr = f"Total number of errors: {total_errors}"
+    for file, errors in file_error_count.items():
+        retstr += (f"\n{file} errors = {errors}")
+
+    return retstr
 
+# Function summary: Reads the lint report in a single streaming pass, counting the errors per file and
+# offering every finding to the selector, which only builds the annotations it keeps.
+@tracing.traced()
+def scan_lint_report(json_file, path_index, selector):
     # Counters
     total_errors = 0
     file_error_count= {} # To add error count per file
+    external_ids = {} # Holds ids to check against and how often they were used, ensures unique ID's
 
-    # Get the num of errors and errors per file
-    for object in data:
-        if 'FileName' in object and 'FileChanges' in object: # FileName and FileChanges are key in the JSON report made by dotnet format
-            file_name = object['FileName']
+    for document in get_json_normalized(json_file):
+        if 'FileName' not in document or 'FileChanges' not in document: # FileName and FileChanges are key in the JSON report made by dotnet format
+            continue
 
-            # Add error count for file, the report appears to make objects for each error so each mention of filename = 1 error
-            if file_name in file_error_count:
-                file_error_count[file_name] += 1
-            else:
-                file_error_count[file_name] = 1
+        filename = document['FileName']
 
-            total_errors += 1
+        # Add error count for file, the report appears to make objects for each error so each mention of filename = 1 error
+        if filename in file_error_count:
+            file_error_count[filename] += 1
+        else:
+            file_error_count[filename] = 1
 
-    # Build string to return
-    retstr = f"Total number of errors: {total_errors}"
-    for file, errors in file_error_count.items():
-        retstr += (f"\n{file} errors = {errors}")
+        total_errors += 1
 
-    return retstr
+        # Find the relative path in the index, already with "/" slashes to match the git repo
+        relative_path = file_path_index.resolve_path(path_index, filename, document.get('FilePath'))
+        print(f"Processing file: {filename}, relative path: {relative_path}")
+
+        if(relative_path == None):
+            print("File Not Found")
+            continue #if path not found skip annotation
+
+        # Process each file change
+        for change in document['FileChanges']:
+            line_number = change['LineNumber']
+            summary = change['FormatDescription']
+            id = f"{relative_path} + {line_number}"
+
+            # If ID found concat a counter on, which stays the same between runs so incremental uploads can match it
+            if id in external_ids:
+                external_ids[id] += 1
+                id += f"-{external_ids[id]}"
+            else:
+                external_ids[id] = 1
+
+            # Create the annotation object, only if the selector keeps it
+            # "type": "<string>", not sure if needed is on REST API doc
+            selector.offer(lambda: bitbucket_annotations.Annotation(
+                external_id=id,
+                annotation_type="CODE_SMELL",
+                path=relative_path,
+                line=line_number,
+                summary=summary,
+                result="FAILED",
+                severity="LOW"
+            ), "LOW", relative_path, line_number)
+
+    return build_error_details(total_errors, file_error_count)
 
 # Command-line arguments: 
 parser = argparse.ArgumentParser(description="Arguments for Bitbucket test reports.", formatter_class=argparse.ArgumentDefaultsHelpFormatter)
@@ -54,11 +94,13 @@ parser.add_argument("lint-report-path", help="The path in the Jenkins workspace
 parser.add_argument("commit", help="The commit hash the report will be sent to.")
 parser.add_argument("Result", choices=['Pass', 'Fail'], help="pass or fail, indicating what type of report.")
 parser.add_argument("Unity-Project", help="The path to the unity project") #DONT FORGET TO ADD ARGS TO JENKINS FILE!!!
+parser.add_argument("--cache-path-index", action='store_true', help="Reuse the project's file path index from the disk cache when the commit has not changed.")
+parser.add_argument("--diff-base", default=f"origin/{os.getenv('DESTINATION_BRANCH')}" if os.getenv('DESTINATION_BRANCH') else None, help="The ref the PR is compared to, findings in the files it changes are sent first.")
+parser.add_argument("--incremental", action='store_true', help="Only upload annotations that changed since the last upload to this commit's report, and delete resolved ones.")
 
 args = vars(parser.parse_args())
 
 # Environment variables:
-access_token = os.getenv('BITBUCKET_ACCESS_TOKEN')
 ticket_number = os.getenv('TICKET_NUMBER')
 pr_repo = os.getenv('JOB_REPO')
 folder_name = os.getenv('FOLDER_NAME')
@@ -66,18 +108,24 @@ report_id = 'lint-test-report'
 # Global variables:
 url = f'{pr_repo}/commit/{args["commit"]}/reports/{report_id}'
 
-headers = {
-    "Accept": "application/json",
-    "Content-Type": "application/json",
-    "Authorization": "Bearer " + access_token
-}
-
 result = "PASSED" if args["Result"] == "Pass" else "FAILED"
 details = "0 Formatting errors" if args["Result"] == "Pass" else "Formatting Errors Detected"
-datastring = "No report" if args["Result"] == "Pass" else count_errors(args["lint-report-path"])
+datastring = "No report"
+annotations = []
+
+# One streaming pass over the lint report builds both the report details and the annotations
+if args["Result"] == "Fail":
+    search_path = os.path.normpath(args["Unity-Project"])
+    path_index = file_path_index.load_path_index(search_path, args["cache_path_index"]) # One walk of the project for every file in the report
+    # Findings in files changed by the PR are sent first when there are more than the annotation limit
+    changed_files = bitbucket_annotations.get_changed_files(search_path, args["diff_base"])
+    selector = bitbucket_annotations.AnnotationSelector(changed_files=changed_files)
+    datastring = scan_lint_report(args["lint-report-path"], path_index, selector)
+    annotations = selector.select()
+    selector.print_dropped_summary()
 
 # Sending the report to Bitbucket Cloud API.
-report = json.dumps( {
+report = {
     "title": f"Linting Report",
     "details": f"{details}", 
     "report_type": "TEST",
@@ -96,108 +144,27 @@ report = json.dumps( {
             "value": True  if args["Result"] == "Pass" else False 
         }
     ]
-} )
+}
 
 try:
-    response = requests.put(url, data=report, headers=headers)
-    response.raise_for_status()
+    bitbucket_client.put_report(url, report)
 except requests.exceptions.RequestException as e:
-    print(f"Initial Request: {e.request.body}")
-    print(f"Response Error: {json.dumps(e.response.json())}")
+    bitbucket_client.print_request_error(e)
+    bitbucket_client.print_delivery_summary()
     exit(1)
 
-#Early exit, if pass no annotations to add to report
-if(args["Result"]== "Pass"): exit(0)
+#Early exit, if pass no annotations to add to report (an incremental upload still deletes the resolved ones)
+if(args["Result"]== "Pass" and not args["incremental"]):
+    bitbucket_client.print_delivery_summary()
+    exit(0)
 
 #probably best to keep the annotations sending seperate from that report request, still in the same script as we need the report path anyway
 
-# Function definitions
-# Function Summary: This function takes a file and path, to give you the relative path to file from the given path
-def find_file_path(filename, search_path):
-    for root, dirs, files in os.walk(search_path):
-        if filename in files:
-            return os.path.relpath(os.path.join(root, filename), search_path)
-    return None
-
-# Function summary: This function takes the total annotations, and a batch size then slices the list
-# According to the batch size yield returning the chunk and repeating
-def chunk_annotations(annotations, batch_size):
-    for i in range(0, len(annotations), batch_size):
-        yield annotations[i:i + batch_size] # List slices ie 0:100, 100:200, yield can return multiple times
-
-# Variable declarations
-data = get_json_normalized(args["lint-report-path"])
-search_path = os.path.normpath(args["Unity-Project"])
-annotations = []
-external_ids = set() # Holds ids to check against, ensures unique ID's
-
-# Loop to build json array of Annotations
-for document in data:
-    filename = document['FileName']
-    file_changes = document['FileChanges']
-    
-    # Find the relative path using the provided function
-    relative_path = find_file_path(filename, search_path)
-
-    relative_path = relative_path.replace("\\", "/") # replace slashes to match git repo slashes 
-    print(f"Processing file: {filename}, relative path: {relative_path}")
-
-    if(relative_path == None): 
-        print("File Not Found")
-        continue #if path not found skip annotation
-    
-    # Process each file change
-    for change in file_changes:
-        line_number = change['LineNumber']
-        summary = change['FormatDescription']
-        id = f"{relative_path} + {line_number}"
-
-        # If ID found concat a UUID on
-        if id in external_ids:
-            id += f"-{uuid.uuid4()}"
-        else:
-            external_ids.add(id)
-        
-        # Create the annotation object
-        # "type": "<string>", not sure if needed is on REST API doc
-        annotation = {
-            "external_id": id,
-            "annotation_type": "CODE_SMELL",
-            "path": relative_path,
-            "line": line_number,
-            "summary": summary,
-            "result": "FAILED",
-            "severity": "LOW"
-        }
-        
-        # Add the annotation to the list
-        annotations.append(annotation)
-
-# Limits according to Bitbucket REST API docs
-max_annotations = 1000  # The total max number of annotations allowed per report
-batch_size = 100        # Limit of annotations per request
-
 # Request stuff below here
 AnnotationUrl = url + f'/annotations'
-# Can re use headers
-# Only send up to 1000 annotations, Slices excess off limit of REST API
-annotations_to_send = annotations[:max_annotations]
-
-# Loop through the chunks and send requests
-for idx, annotation_batch in enumerate(chunk_annotations(annotations_to_send, batch_size)):
-    # Create the JSON body for this batch
-    AnnotationReport = json.dumps(annotation_batch)
-
-    
-    # Send the request
-    try:
-        response = requests.post(AnnotationUrl, data=AnnotationReport, headers=headers)
-        response.raise_for_status()  # This will raise an exception for HTTP errors
-        print(f"Batch {idx+1} sent successfully") # Remove later for debugging
-    except requests.exceptions.RequestException as e:
-        print(f"Error with batch {idx+1}: {e.request.body}")
-        if e.response:
-            print(f"Response Error: {json.dumps(e.response.json())}")
-        else:
-            print(f"General Exception: {e}")
-        exit(0)  # Exit on error
\ No newline at end of file
+# Sends the batches concurrently, only up to the 1000 annotation limit of the REST API
+if args["incremental"]:
+    annotation_snapshot.upload_changed(AnnotationUrl, annotations, f"{pr_repo}|{ticket_number}", report_id, args["commit"])
+else:
+    bitbucket_client.upload_annotations(AnnotationUrl, annotations)
+bitbucket_client.print_delivery_summary()
@@ -0,0 +1,116 @@
+import re
+import html
+import hashlib
+import log_index
+
+# Streaming compaction of logs for the log report. Runs of identical consecutive lines are folded into one
+# entry with a repeat count, and a stack trace that already appeared earlier in the log is folded into one
+# entry that points back to its first occurrence, which is the only one written out in full.
+# Every entry keeps the original line numbers it covers, so line numbers, markers and page ranges still
+# refer to the log itself. Only the current run and stack trace are buffered, plus a hash per distinct trace.
+
+# Constant variables:
+MIN_REPEATS = 2          # Identical consecutive lines are folded from this many
+MIN_TRACE_FRAMES = 2     # Shorter stack traces are not worth folding
+MIN_FOLDED_CHARACTERS = 200  # About the length of a folded entry's markup, hiding less text would make the page larger
+MAX_TRACE_FRAMES = 500   # Longer runs of frames are written out as they are
+MAX_TRACES = 10000       # Distinct stack traces remembered per log
+STACK_FRAME = re.compile(log_index.STACK_FRAME.pattern.decode("ascii"))
+FOLDED_TYPES = ("repeat", "trace_repeat")  # Entries that show several lines of the log as one
+
+
+# Function summary: Folds (text, marker) pairs, in log order, into entries. Every entry is a dict with a type
+# and the first and last line it covers:
+# "line" (text, marker), "repeat" (text, marker, count), "trace" (lines, the first occurrence of a stack trace)
+# and "trace_repeat" (text and marker of its first frame, frames, source line of the first occurrence, occurrence).
+def fold_lines(lines, min_repeats=MIN_REPEATS):
+    seen_traces = {}  # Hash of a stack trace: [line of its first occurrence, occurrences]
+    run = None        # [first line, text, marker, count] of the current run of identical lines
+    trace = []        # (line, text, marker) of the stack trace being read
+
+    def flush_run():
+        first, text, marker, count = run
+        if count >= min_repeats and (count - 1) * len(text) >= MIN_FOLDED_CHARACTERS:
+            return [{"type": "repeat", "first": first, "last": first + count - 1, "text": text, "marker": marker, "count": count}]
+        # Too short to be worth folding, every line of the run is written out with its own number
+        return [{"type": "line", "first": line, "last": line, "text": text, "marker": marker} for line in range(first, first + count)]
+
+    def flush_trace():
+        first, last = trace[0][0], trace[-1][0]
+        if len(trace) < MIN_TRACE_FRAMES or sum(len(text) for line, text, marker in trace[1:]) < MIN_FOLDED_CHARACTERS:
+            return [{"type": "line", "first": line, "last": line, "text": text, "marker": marker} for line, text, marker in trace]
+        key = hashlib.sha1("\n".join(text.strip() for line, text, marker in trace).encode("utf-8")).digest()
+        source = seen_traces.get(key)
+        if source is not None:
+            source[1] += 1
+            return [{"type": "trace_repeat", "first": first, "last": last, "text": trace[0][1], "marker": trace[0][2],
+                     "frames": len(trace), "source": source[0], "occurrence": source[1]}]
+        if len(seen_traces) < MAX_TRACES:
+            seen_traces[key] = [first, 1]
+        return [{"type": "trace", "first": first, "last": last, "lines": [(text, marker) for line, text, marker in trace]}]
+
+    line_number = 0
+    for text, marker in lines:
+        line_number += 1
+        text = text.rstrip("\r\n")
+        if STACK_FRAME.match(text):
+            if run is not None:
+                yield from flush_run()
+                run = None
+            trace.append((line_number, text, marker))
+            if len(trace) >= MAX_TRACE_FRAMES:
+                yield {"type": "trace", "first": trace[0][0], "last": line_number, "lines": [(text, marker) for line, text, marker in trace]}
+                trace = []
+            continue
+
+        if trace:
+            yield from flush_trace()
+            trace = []
+        if run is not None and run[1] == text:
+            run[3] += 1
+            if marker is not None and run[2] is None:
+                run[2] = marker
+            continue
+        if run is not None:
+            yield from flush_run()
+        run = [line_number, text, marker, 1]
+
+    if trace:
+        yield from flush_trace()
+    if run is not None:
+        yield from flush_run()
+
+# Function summary: Returns the HTML of one entry. Lines with a marker get an anchor named after the log and line number,
+# and folded entries carry the anchor of their first line and their line range for the viewer.
+def render_entry(entry, log_name, escape=html.escape):
+    entry_type = entry["type"]
+    if entry_type == "line":
+        return render_line(entry["text"], entry["marker"], log_name, entry["first"], escape)
+    if entry_type == "trace":
+        lines = "".join(render_line(text, marker, log_name, entry["first"] + offset, escape) for offset, (text, marker) in enumerate(entry["lines"]))
+        return f'<div class="trace" id="{log_name}-T{entry["first"]}">\n{lines}</div>\n'
+
+    marker_class = f' {entry["marker"]}' if entry["marker"] else ""
+    attributes = f'id="{log_name}-L{entry["first"]}" data-first="{entry["first"]}" data-last="{entry["last"]}"'
+    if entry_type == "repeat":
+        return (f'<details class="repeat{marker_class}" {attributes}><summary>{escape(entry["text"])} <small>(repeated {entry["count"]} times)</small></summary>'
+                f'<small>Lines {entry["first"]}-{entry["last"]} are this same line.</small></details>\n')
+    return (f'<details class="trace-repeat{marker_class}" {attributes} data-source="{entry["source"]}"><summary>{escape(entry["text"])} '
+            f'<small>(and {entry["frames"] - 1} more lines, the stack trace of line {entry["source"]}, seen {entry["occurrence"]} times)</small></summary></details>\n')
+
+def render_line(text, marker, log_name, line_number, escape=html.escape):
+    text = escape(text)
+    if marker is not None:
+        text = f'<mark id="{log_name}-L{line_number}" class="{marker}">{text}</mark>'
+    return f"{text}<br>\n"
+
+# Function summary: Yields the rendered HTML of a log's lines, folded, for the single page log report.
+# The lines are not escaped there, as they never have been.
+def render_lines(lines, log_name, fold=True):
+    pairs = ((line, None) for line in lines)
+    if not fold:
+        for line_number, (text, marker) in enumerate(pairs, 1):
+            yield render_line(text.rstrip("\r\n"), marker, log_name, line_number, str)
+        return
+    for entry in fold_lines(pairs):
+        yield render_entry(entry, log_name, str)
@@ -0,0 +1,93 @@
+import os
+import re
+import json
+
+# Sidecar index of a log for the paginated log viewer, built while the log's pages are written.
+# The log is read as bytes one line at a time, and the index records a jump table of the interesting lines:
+# known error signatures from logErrors.txt, exceptions, and the first frame of each stack trace.
+# Markers are by line number only, since the raw logs are not published: the viewer fetches the table and
+# loads only the page a marker is on, instead of every page before it. A folded entry of the page gets one
+# marker on its first line, however many of the lines it covers were marked.
+
+# Constant variables:
+MAX_MARKERS = 2000   # Markers kept in the jump table per log, the counts include the ones left out
+MARKER_TEXT = 160    # Characters of the marked line kept for the jump table
+MARKERS_FILE = "markers.json"
+EXCEPTION = re.compile(rb"\b(?:\w+\.)*\w*Exception\b:|^Unhandled [Ee]xception")
+# .NET, Mono and Java frames ("  at Foo.Bar ()"), and Unity's own ("UnityEngine.Debug:Log (object) (at ...)")
+STACK_FRAME = re.compile(rb"\s+at \S|[\w.<>`+$/\[\],]+:[\w.<>`+$]+ ?\(.*\)\s*(?:\(at .*\))?\s*$")
+
+
+class LogIndexer:
+    # Follows the lines of one log in order, keeping the markers of the interesting ones.
+    # matcher is the compiled logErrors.txt regex from log_scanner.compile_patterns, or None.
+    def __init__(self, matcher=None):
+        self.matcher = matcher
+        self.line_count = 0
+        self.markers = []
+        self.counts = {}
+        self.dropped = 0
+        self.in_stack_trace = False
+
+    # Function summary: Takes the next line of the log as bytes, and returns its marker kind or None.
+    def add_line(self, raw_line):
+        self.line_count += 1
+
+        kind = None
+        label = None
+        match = self.matcher.search(raw_line) if self.matcher is not None else None
+        is_frame = STACK_FRAME.match(raw_line) is not None
+        if match is not None:
+            kind = "error"
+            label = match.group().decode("utf-8", errors="replace")
+        elif is_frame and not self.in_stack_trace:
+            kind = "stack_trace"
+        elif not is_frame and b"xception" in raw_line and EXCEPTION.search(raw_line):
+            kind = "exception"
+        self.in_stack_trace = is_frame
+
+        if kind is not None:
+            self.counts[kind] = self.counts.get(kind, 0) + 1
+            if len(self.markers) < MAX_MARKERS:
+                text = raw_line.decode("utf-8", errors="replace").strip()[:MARKER_TEXT]
+                marker = {"line": self.line_count, "kind": kind, "text": text}
+                if label is not None:
+                    marker["pattern"] = label
+                self.markers.append(marker)
+            else:
+                self.dropped += 1
+        return kind
+
+    # Function summary: Merges the markers of the lines first to last, which the page shows as one folded entry,
+    # into a single marker on the first line that records how many it stands for. Markers of the lines read
+    # after last, while the entry was still being folded, are kept as they are.
+    def fold(self, first, last):
+        start = len(self.markers)
+        while start > 0 and self.markers[start - 1]["line"] >= first:
+            start -= 1
+        folded = [marker for marker in self.markers[start:] if marker["line"] <= last]
+        if not folded or (len(folded) == 1 and folded[0]["line"] == first):
+            return
+        after = [marker for marker in self.markers[start:] if marker["line"] > last]
+        self.markers[start:] = [dict(folded[0], line=first, folded=len(folded))] + after
+
+    # Function summary: Returns the sidecar index as a dict.
+    def to_dict(self):
+        return {
+            "lines": self.line_count,
+            "counts": self.counts,
+            "truncated": self.dropped > 0,
+            "markers": self.markers
+        }
+
+    # Function summary: Writes the sidecar index into the log's page folder.
+    def write(self, log_dir, open_file):
+        with open_file(os.path.join(log_dir, MARKERS_FILE)) as f:
+            f.write(json.dumps(self.to_dict(), separators=(",", ":")))
+
+
+# Function summary: Lazily yields the lines of a log as bytes, line endings included. Yields nothing if the log does not exist.
+def read_raw_lines(path):
+    if os.path.isfile(path):
+        with open(path, "rb") as log_file:
+            yield from log_file
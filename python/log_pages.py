@@ -0,0 +1,119 @@
+import os
+import json
+import tracing
+import log_index
+import log_folding
+
+# Splits logs into fixed-size HTML page fragments for the paginated log viewer.
+# Each log gets its own folder of pages under <report dir>/logs/, and a small index lists
+# the pages with the line range they hold, so the viewer only downloads the pages it shows.
+# When the log is read with a log_index.LogIndexer, its markers are written next to the pages and
+# the marked lines get an anchor the viewer can jump to.
+# Repeated lines and stack traces are folded by log_folding, and pages are filled by rendered lines, so a
+# page's line range in the index can cover more log lines than the page size.
+
+# Constant variables:
+DEFAULT_PAGE_SIZE = 5000  # Lines per page
+PAGES_DIR = "logs"
+INDEX_FILE = "index.json"
+
+
+class LogPageWriter:
+    # Writes the lines of one log into numbered page files and keeps track of the page index.
+    # open_file is called with each page's path and must return a writable text file.
+    def __init__(self, report_dir, log_name, page_size=DEFAULT_PAGE_SIZE, open_file=None):
+        self.report_dir = report_dir
+        self.open_file = open_file or open_text_file
+        self.log_name = log_name
+        self.page_size = page_size
+        self.log_dir = os.path.join(report_dir, PAGES_DIR, log_name)
+        self.pages = []
+        self.line_count = 0
+        self.page_file = None
+        self.page_lines = 0
+        os.makedirs(self.log_dir, exist_ok=True)
+        self.remove_old_pages()
+
+    # Function summary: Deletes pages left by a previous build in the same report folder.
+    def remove_old_pages(self):
+        for entry in os.scandir(self.log_dir):
+            if entry.is_file() and (entry.name.startswith("page-") or entry.name.startswith(log_index.MARKERS_FILE)):
+                os.remove(entry.path)
+
+    # Function summary: Adds one line to the current page, starting a new page when it is full.
+    # A line with a marker kind is wrapped in an anchor named after the log and its line number.
+    def write_line(self, line, marker=None):
+        self.write_entry({"type": "line", "first": self.line_count + 1, "last": self.line_count + 1, "text": line.rstrip("\r\n"), "marker": marker})
+
+    # Function summary: Adds one log_folding entry to the current page, starting a new page when it is full.
+    def write_entry(self, entry):
+        if self.page_file is None or self.page_lines >= self.page_size:
+            self.start_page()
+
+        self.line_count = entry["last"]
+        self.page_lines += len(entry["lines"]) if entry["type"] == "trace" else 1
+        self.pages[-1]["last_line"] = self.line_count
+        self.page_file.write(log_folding.render_entry(entry, self.log_name))
+
+    # Function summary: Closes the current page and opens the next numbered one.
+    def start_page(self):
+        self.close_page()
+        page_name = f"page-{len(self.pages) + 1:05d}.html"
+        self.page_file = self.open_file(os.path.join(self.log_dir, page_name))
+        self.page_lines = 0
+        self.pages.append({
+            "file": f"{PAGES_DIR}/{self.log_name}/{page_name}",
+            "first_line": self.line_count + 1,
+            "last_line": self.line_count
+        })
+
+    def close_page(self):
+        if self.page_file is not None:
+            self.page_file.close()
+            self.page_file = None
+
+    # Function summary: Closes the last page and returns this log's entry for the index.
+    def close(self):
+        self.close_page()
+        return {"lines": self.line_count, "pages": self.pages}
+
+
+# Function summary: Opens a plain UTF-8 text file for writing.
+def open_text_file(path):
+    return open(path, mode="w", encoding="utf-8")
+
+# Function summary: Writes every line of a log into pages, folded unless fold is False, and returns its index entry.
+# With an indexer the lines are bytes, as read by log_index.read_raw_lines, and the log's markers are
+# written in the same pass. The entry then also names the markers file and has the marker counts.
+def write_log_pages(lines, report_dir, log_name, page_size=DEFAULT_PAGE_SIZE, open_file=None, indexer=None, fold=True):
+    with tracing.span("write_log_pages", log=log_name) as attributes:
+        writer = LogPageWriter(report_dir, log_name, page_size, open_file)
+        if indexer is None:
+            pairs = ((line, None) for line in lines)
+        else:
+            pairs = ((raw_line.decode("utf-8", errors="replace"), indexer.add_line(raw_line)) for raw_line in lines)
+        try:
+            if fold:
+                for entry in log_folding.fold_lines(pairs):
+                    writer.write_entry(entry)
+                    if indexer is not None and entry["type"] in log_folding.FOLDED_TYPES:
+                        indexer.fold(entry["first"], entry["last"])
+            else:
+                for line, marker in pairs:
+                    writer.write_line(line, marker)
+        finally:
+            entry = writer.close()
+        if indexer is not None:
+            indexer.write(writer.log_dir, writer.open_file)
+            entry["markers"] = {"file": f"{PAGES_DIR}/{log_name}/{log_index.MARKERS_FILE}", "counts": indexer.counts}
+        attributes.update(lines=entry["lines"], pages=len(entry["pages"]))
+    return entry
+
+# Function summary: Writes the index of all paginated logs next to the pages and returns it as a JSON string.
+def write_index(report_dir, logs, page_size, open_file=None):
+    index = {"page_size": page_size, "logs": logs}
+    index_json = json.dumps(index, separators=(",", ":"))
+    open_file = open_file or open_text_file
+    with open_file(os.path.join(report_dir, PAGES_DIR, INDEX_FILE)) as f:
+        f.write(index_json)
+    return index_json
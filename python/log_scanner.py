@@ -0,0 +1,94 @@
+import re
+import tracing
+
+# Streaming multi-pattern scanner for large Unity logs.
+# All known error signatures are compiled into one combined regex, and the log is read in
+# fixed-size binary chunks that are cut at line boundaries, so memory use does not depend on the
+# log size and each chunk is scanned once no matter how many signatures there are.
+
+# Constant variables:
+CHUNK_SIZE = 1024 * 1024  # Bytes read from the log at a time
+
+
+# Function summary: Reads the error signatures from a file like logErrors.txt.
+# Trailing newlines and blank lines are dropped, and duplicates are only kept once.
+def load_patterns(patterns_file):
+    with open(patterns_file, 'r', encoding='utf-8') as f:
+        patterns = [line.strip("\r\n") for line in f]
+    return list(dict.fromkeys(pattern for pattern in patterns if pattern.strip()))
+
+# Function summary: Compiles literal patterns into one bytes regex.
+# Longer patterns come first so a pattern that contains a shorter one is the one reported.
+def compile_patterns(patterns):
+    if not patterns:
+        return None
+    ordered = sorted(patterns, key=len, reverse=True)
+    return re.compile(b"|".join(re.escape(pattern.encode('utf-8')) for pattern in ordered))
+
+# Function summary: Yields (byte offset, block) pairs where every block ends on a line boundary.
+# Only the last block can end without a newline, when the log itself does.
+def iter_line_blocks(log_file, chunk_size=CHUNK_SIZE):
+    offset = 0
+    remainder = b""
+    while True:
+        chunk = log_file.read(chunk_size)
+        tracing.count("log_bytes_read", len(chunk))
+        if not chunk:
+            if remainder:
+                yield offset, remainder
+            return
+
+        block = remainder + chunk
+        end = block.rfind(b"\n")
+        if end == -1:
+            remainder = block  # A single line longer than the chunk size, keep reading
+            continue
+
+        yield offset, block[:end + 1]
+        offset += end + 1
+        remainder = block[end + 1:]
+
+# Function summary: Scans a log and yields a match for every line that contains one of the patterns.
+# Each match is a dict with the 1-based line number, the byte offset of the line, the pattern and the line text.
+def iter_matches(log_path, matcher, chunk_size=CHUNK_SIZE):
+    if matcher is None:
+        return
+
+    lines_before = 0
+    with open(log_path, 'rb') as log_file:
+        for block_offset, block in iter_line_blocks(log_file, chunk_size):
+            counted_to = 0
+            line_number = lines_before
+            position = 0
+            while True:
+                match = matcher.search(block, position)
+                if match is None:
+                    break
+
+                line_start = block.rfind(b"\n", 0, match.start()) + 1
+                line_end = block.find(b"\n", match.end())
+                if line_end == -1:
+                    line_end = len(block)
+
+                line_number += block.count(b"\n", counted_to, line_start)
+                counted_to = line_start
+                yield {
+                    "line": line_number + 1,
+                    "offset": block_offset + line_start,
+                    "pattern": match.group().decode('utf-8'),
+                    "text": block[line_start:line_end].rstrip(b"\r").decode('utf-8', errors='replace')
+                }
+                position = line_end + 1  # Report each line once, even if it matches several patterns
+
+            lines_before += block.count(b"\n")
+
+# Function summary: Returns the first matching line of the log, or None if there is no match.
+def find_first_match(log_path, matcher, chunk_size=CHUNK_SIZE):
+    return next(iter_matches(log_path, matcher, chunk_size), None)
+
+# Function summary: Counts how many lines of the log matched each pattern, including patterns with no matches.
+def count_matches(log_path, patterns, matcher, chunk_size=CHUNK_SIZE):
+    counts = dict.fromkeys(patterns, 0)
+    for match in iter_matches(log_path, matcher, chunk_size):
+        counts[match["pattern"]] += 1
+    return counts
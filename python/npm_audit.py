@@ -1,50 +1,70 @@
-import json
 import os
 import sys
 import requests
 import argparse
+import bitbucket_client
+import json_stream
+import tracing
+import annotations as bitbucket_annotations
 
+# Streams the report's vulnerabilities one package at a time instead of loading the whole audit report.
 def categorize_vulnerabilities(file_path):
-    try:
-        with open(file_path) as file:
-            data = json.load(file)
-    except FileNotFoundError:
+    if not os.path.isfile(file_path):
         print(f"Audit report file not found: {file_path}")
         return
     
-    vulnerabilities = data.get('vulnerabilities', {})
-    if not vulnerabilities:
-        print("No vulnerabilities found.")
-        return
-    
     categorized = {}
+    package_count = 0
 
-    for package, details in vulnerabilities.items():
+    for package, details in json_stream.iter_object_items(file_path, ("vulnerabilities",)):
+        package_count += 1
         for vulnerability in details.get('via', []):
+            # A plain package name means the advisory comes from a dependency, which has its own entry
+            if not isinstance(vulnerability, dict):
+                continue
             severity = vulnerability.get('severity', 'unknown')
             categorized.setdefault(severity, []).append({
                 'package': package,
                 'issue': vulnerability.get('title', 'Unknown issue'),
-                'url': vulnerability.get('url', 'No URL provided')
+                'url': vulnerability.get('url', 'No URL provided'),
+                'source': vulnerability.get('source')
             })
 
+    if package_count == 0:
+        print(f"No vulnerabilities found in {file_path}.")
+        return
+
+    return categorized
+
+# Function summary: Merges the categorized vulnerabilities of several audit reports.
+# The same advisory on the same package, found in several directories, is only kept once.
+def merge_vulnerabilities(categorized_reports):
+    merged = {}
+    seen = set()
+
+    for categorized in categorized_reports:
+        for severity, issues in (categorized or {}).items():
+            for issue in issues:
+                advisory = issue['source'] or issue['url'] or issue['issue']
+                if (issue['package'], advisory) in seen:
+                    continue
+                seen.add((issue['package'], advisory))
+                merged.setdefault(severity, []).append(issue)
+
+    return merged
+
+def print_vulnerabilities(categorized):
     for severity, issues in categorized.items():
         print(f"Severity: {severity}")
         for issue in issues:
             print(f" - Package: {issue['package']}, Issue: {issue['issue']}, URL: {issue['url']}")
 
-    return categorized
-
-def chunk_annotations(annotations, batch_size):
-    for i in range(0, len(annotations), batch_size):
-        yield annotations[i:i + batch_size]  # List slices ie 0:100, 100:200, etc.
-
 
 # Command-line arguments: 
 parser = argparse.ArgumentParser(description="Arguments for Bitbucket test reports.", formatter_class=argparse.ArgumentDefaultsHelpFormatter)
 
 parser.add_argument("commit", help="The commit hash the report will be sent to.")
-parser.add_argument("path_to_report", help="The path to the report of the audit.")
+parser.add_argument("path_to_report", nargs="+", help="The path(s) to the audit reports, one per testing directory.")
 
 args = vars(parser.parse_args())
 
@@ -61,20 +81,21 @@ if not access_token or not ticket_number or not pr_repo:
 url = f'{pr_repo}/commit/{args["commit"]}/reports/Audit-report'
 annotation_url = url + f'/annotations'
 
-headers = {
-    "Accept": "application/json",
-    "Content-Type": "application/json",
-    "Authorization": "Bearer " + access_token
-}
+# Parses every directory's audit report one after another, then merges them into one report.
+# The parsing is pure Python and CPU bound, so threads would only take turns on the GIL.
+report_paths = args["path_to_report"]
+with tracing.span("categorize_vulnerabilities", reports=len(report_paths)):
+    categorized_reports = [categorize_vulnerabilities(report_path) for report_path in report_paths]
 
-vulnerabilities = categorize_vulnerabilities(args["path_to_report"])
-num_of_vuln = num_of_vuln = len(vulnerabilities or {})
+vulnerabilities = merge_vulnerabilities(categorized_reports)
+print_vulnerabilities(vulnerabilities)
+num_of_vuln = sum(len(issues) for issues in vulnerabilities.values())
 
 
 # Sending the report to Bitbucket Cloud API.
-report = json.dumps( {
+report = {
     "title": f"{ticket_number}: Consolidated Audit Report",
-    "details": "Audit Report",
+    "details": f"Audit Report for {len(report_paths)} directories" if len(report_paths) > 1 else "Audit Report",
     "report_type": "SECURITY",
     "reporter": "Jenkins",
     "data": [
@@ -84,53 +105,38 @@ report = json.dumps( {
             "value": num_of_vuln
         }
     ]
-} )
+}
 
 try:
-    response = requests.put(url, data=report, headers=headers)
-    response.raise_for_status()
+    bitbucket_client.put_report(url, report)
 except requests.exceptions.RequestException as e:
-    print(f"Initial Request: {e.request.body}")
-    print(f"Response Error: {json.dumps(e.response.json())}")
+    bitbucket_client.print_request_error(e)
+    bitbucket_client.print_delivery_summary()
     exit(1)
 
 
-# Preparing annotations for vulnerabilities
-annotations = []
+# Preparing annotations for vulnerabilities, the most severe ones are kept when there are more than the limit
+selector = bitbucket_annotations.AnnotationSelector()
 if vulnerabilities:
     for severity, issues in vulnerabilities.items():
         for issue in issues:
-            annotation = {
-                "external_id": f"{issue['package']}_{issue['issue']}",  # Unique identifier for the annotation
-                "annotation_type": "VULNERABILITY",
-                "summary": f"Vulnerability in {issue['package']}: {issue['issue']}",
-                "result": "FAILED",
-                "severity": severity.upper(),
-                "url": issue["url"]
-            }
-            annotations.append(annotation)
+            selector.offer(lambda: bitbucket_annotations.Annotation(
+                external_id=f"{issue['package']}_{issue['issue']}",  # Unique identifier for the annotation
+                annotation_type="VULNERABILITY",
+                summary=f"Vulnerability in {issue['package']}: {issue['issue']}",
+                result="FAILED",
+                severity=severity,  # npm's moderate is sent as MEDIUM
+                url=issue["url"]
+            ), severity)
+    annotations = selector.select()
+    selector.print_dropped_summary()
 else:
+    bitbucket_client.print_delivery_summary()
     exit(0)
 
-# Limit annotations to comply with Bitbucket REST API
-max_annotations = 1000
-batch_size = 100
-annotations_to_send = annotations[:max_annotations]
-
-# Sending annotations in batches
-for idx, annotation_batch in enumerate(chunk_annotations(annotations_to_send, batch_size)):
-    annotation_report = json.dumps(annotation_batch)
-    try:
-        response = requests.post(annotation_url, data=annotation_report, headers=headers)
-        response.raise_for_status()
-        print(f"Batch {idx + 1} sent successfully")
-    except requests.exceptions.RequestException as e:
-        print(f"Error with batch {idx + 1}: {e.request.body}")
-        if e.response:
-            print(f"Response Error: {json.dumps(e.response.json())}")
-        else:
-            print(f"General Exception: {e}")
-        exit(0)  # Exit on error
+# Sending annotations in concurrent batches, limited to comply with Bitbucket REST API
+bitbucket_client.upload_annotations(annotation_url, annotations)
+bitbucket_client.print_delivery_summary()
 
 
 
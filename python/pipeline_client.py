@@ -0,0 +1,165 @@
+import os
+import sys
+import json
+import time
+import hashlib
+import http.client
+
+# Thin command line front end for pipeline_daemon.py.
+# Usage: python -S pipeline_client.py <script.py> [script arguments...]
+# The call is forwarded to the workspace's daemon when one is running. Otherwise a daemon is started
+# in the background for the next call and the script runs in this process, so the result is always the same.
+# Set PIPELINE_DAEMON=0 to always run scripts in this process.
+# Only cheap standard library modules are imported up front, since this runs on every forwarded call.
+# Starting it with "python -S" also skips site-packages, which are only loaded if the script has to run locally.
+
+# Constant variables:
+CLIENT_START = time.perf_counter()  # Start of a traced run's timeline
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+CONNECT_TIMEOUT = 2  # Seconds to wait when reaching the daemon
+EXCLUDED_SCRIPTS = {"pipeline_daemon.py", "pipeline_client.py"}
+
+
+# Function summary: Returns a hash of the names, sizes and modification times of the folder's Python files.
+# A daemon keeps the helper modules it has imported, so it may only serve calls made with the same files.
+def get_code_version(script_dir=SCRIPT_DIR):
+    files = []
+    for entry in os.scandir(script_dir):
+        if entry.name.endswith(".py") and entry.is_file():
+            stat = entry.stat()
+            files.append((entry.name, stat.st_size, stat.st_mtime_ns))
+    return hashlib.sha1(repr(sorted(files)).encode("utf-8")).hexdigest()[:12]
+
+# Function summary: Returns the path of the file where the daemon publishes its port and token.
+# The name includes a hash of the script folder so daemons of different workspaces never mix, and the code
+# version so a checkout with changed scripts gets a new daemon instead of one with the old modules loaded.
+def get_state_file(script_dir=SCRIPT_DIR, code_version=None):
+    temp_dir = os.getenv("TMPDIR") or os.getenv("TEMP") or os.getenv("TMP") or ("C:/Windows/Temp" if os.name == "nt" else "/tmp")
+    dir_hash = hashlib.sha1(os.path.normcase(script_dir).encode("utf-8")).hexdigest()[:12]
+    return os.path.join(temp_dir, f"pipeline-daemon-{dir_hash}-{code_version or get_code_version(script_dir)}.json")
+
+# Function summary: Resolves a script name to a script in this folder, or None if it is not allowed.
+def resolve_script(script_name):
+    script_name = os.path.basename(script_name)
+    script_path = os.path.join(SCRIPT_DIR, script_name)
+    if not script_name.endswith(".py") or script_name in EXCLUDED_SCRIPTS or not os.path.isfile(script_path):
+        return None
+    return script_path
+
+# Function summary: Reads the daemon's port and token, or returns None if no daemon has published them.
+def read_state(code_version):
+    try:
+        with open(get_state_file(code_version=code_version)) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+# Function summary: Sends the script call to the daemon, writes the script's output as it arrives and returns its exit code,
+# or None if the daemon could not be reached. Once the daemon has accepted the call, a failure is reported as an error
+# instead of None so the script is never run twice.
+def forward(state, script_name, script_args, code_version):
+    body = json.dumps({
+        "script": script_name,
+        "args": script_args,
+        "env": dict(os.environ),
+        "cwd": os.getcwd(),
+        "version": code_version
+    })
+    connection = http.client.HTTPConnection("127.0.0.1", state["port"], timeout=CONNECT_TIMEOUT)
+    try:
+        connection.connect()
+    except OSError:
+        connection.close()
+        return None
+
+    try:
+        connection.sock.settimeout(None)  # Scripts such as the log report can run for a long time
+        connection.request("POST", "/run", body=body, headers={"Content-Type": "application/json", "X-Pipeline-Token": state["token"]})
+        response = connection.getresponse()
+        if response.status != 200:
+            # A stale state file from another daemon, or a rejected call; run the script locally instead.
+            error = json.loads(response.read()).get("error")
+            sys.stderr.write(f"Pipeline daemon error: {error}\n")
+            return None
+
+        # One JSON event per line: output of the script as it is written, then its exit code.
+        for line in response:
+            event = json.loads(line)
+            if "exit_code" in event:
+                return event["exit_code"]
+            stream = sys.stdout if event["stream"] == "stdout" else sys.stderr
+            stream.write(event["text"])
+            stream.flush()
+        raise ConnectionError("the daemon closed the connection before the script finished")
+    except (OSError, ValueError, http.client.HTTPException) as e:
+        sys.stderr.write(f"Lost connection to the pipeline daemon: {e}\n")
+        return 1
+    finally:
+        connection.close()
+
+# Function summary: Starts a detached daemon for this workspace that outlives the current call.
+def start_daemon():
+    import subprocess
+    daemon_path = os.path.join(SCRIPT_DIR, "pipeline_daemon.py")
+    options = {"stdin": subprocess.DEVNULL, "stdout": subprocess.DEVNULL, "stderr": subprocess.DEVNULL, "close_fds": True}
+    if os.name == "nt":
+        options["creationflags"] = subprocess.DETACHED_PROCESS | subprocess.CREATE_NEW_PROCESS_GROUP
+    else:
+        options["start_new_session"] = True
+    # Jenkins kills processes a step leaves behind unless they opt out with this cookie
+    env = dict(os.environ, JENKINS_NODE_COOKIE="dontKillMe")
+    try:
+        subprocess.Popen([sys.executable, daemon_path], env=env, **options)
+    except OSError as e:
+        sys.stderr.write(f"Could not start the pipeline daemon: {e}\n")
+
+# Function summary: Runs the script in this process, exactly like "python <script> <args>" would.
+# The run is traced, with the time from the client's start to the script's as its startup.
+def run_locally(script_path, script_args):
+    import runpy
+    import site
+    import tracing
+    tracing.start(script_path, script_args, "local", CLIENT_START)
+    with tracing.span("startup"):
+        if sys.flags.no_site:
+            site.main()  # Started with -S, so the script's third party packages are not on sys.path yet
+    sys.argv = [script_path] + script_args
+
+    exit_code = 1
+    try:
+        with tracing.span("script"):
+            runpy.run_path(script_path, run_name="__main__")
+        exit_code = 0
+    except SystemExit as e:
+        exit_code = e.code if isinstance(e.code, int) else (0 if e.code is None else 1)
+        raise
+    finally:
+        tracing.finish(exit_code)
+
+def main():
+    if len(sys.argv) < 2:
+        sys.stderr.write("Usage: pipeline_client.py <script.py> [arguments...]\n")
+        sys.exit(2)
+
+    script_name = sys.argv[1]
+    script_args = sys.argv[2:]
+    script_path = resolve_script(script_name)
+    if script_path is None:
+        sys.stderr.write(f"Unknown pipeline script: {script_name}\n")
+        sys.exit(2)
+
+    if os.getenv("PIPELINE_DAEMON", "1") == "0":
+        run_locally(script_path, script_args)
+        return
+
+    code_version = get_code_version()
+    state = read_state(code_version)
+    exit_code = forward(state, script_name, script_args, code_version) if state else None
+    if exit_code is None:
+        start_daemon()
+        run_locally(script_path, script_args)
+        return
+    sys.exit(exit_code)
+
+if __name__ == "__main__":
+    main()
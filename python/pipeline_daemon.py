@@ -0,0 +1,215 @@
+import os
+import sys
+import io
+import json
+import time
+import runpy
+import secrets
+import argparse
+import traceback
+import threading
+import contextlib
+import tracing
+from http.server import HTTPServer, BaseHTTPRequestHandler
+from pipeline_client import SCRIPT_DIR, get_code_version, get_state_file, resolve_script
+
+# A long-lived helper service that runs the pipeline's Python scripts inside one warm interpreter.
+# pipeline_client.py forwards each call here over localhost HTTP, so repeated steps skip the
+# interpreter start and the requests/jinja2 imports, and reuse bitbucket_client's pooled session.
+# Each workspace's python folder gets its own daemon, so jobs never run another checkout's scripts, and
+# changed scripts get a new one, since the helper modules a daemon has imported stay loaded between runs.
+# A script's output is streamed back to the client line by line while it runs.
+
+# Constant variables:
+HOST = "127.0.0.1"
+DEFAULT_IDLE_TIMEOUT = 1800  # Seconds without a request before the daemon shuts itself down
+
+
+class StreamWriter(io.TextIOBase):
+    # Stands in for sys.stdout or sys.stderr during a run, and sends every completed line to the client right away.
+    # A client that has gone away stops receiving output, but the script still runs to the end.
+    def __init__(self, name, send):
+        self.name = name
+        self.send = send
+        self.buffer = ""
+
+    def writable(self):
+        return True
+
+    def write(self, text):
+        self.buffer += text
+        if "\n" in self.buffer:
+            lines, _, self.buffer = self.buffer.rpartition("\n")
+            self.send({"stream": self.name, "text": lines + "\n"})
+        return len(text)
+
+    def flush(self):
+        if self.buffer:
+            text, self.buffer = self.buffer, ""
+            self.send({"stream": self.name, "text": text})
+
+
+# Function summary: Runs a script as if it was started with "python <script> <args>" and returns its exit code.
+# Its output is passed to send as events while it runs. The process environment, working directory and argv
+# are swapped for the caller's and restored afterwards.
+def run_script(script_path, script_args, env, cwd, send):
+    stdout = StreamWriter("stdout", send)
+    stderr = StreamWriter("stderr", send)
+    exit_code = 0
+
+    saved_argv = sys.argv
+    saved_env = dict(os.environ)
+    saved_cwd = os.getcwd()
+    try:
+        sys.argv = [script_path] + list(script_args)
+        os.environ.clear()
+        os.environ.update(env)
+        if cwd and os.path.isdir(cwd):
+            os.chdir(cwd)
+
+        # The scheduler outlives the run, so calls of a script that printed no delivery summary must not count for this one
+        import bitbucket_client
+        bitbucket_client.get_scheduler().stats.reset()
+        tracing.start(script_path, script_args, "daemon")
+        with contextlib.redirect_stdout(stdout), contextlib.redirect_stderr(stderr):
+            try:
+                with tracing.span("script"):
+                    runpy.run_path(script_path, run_name="__main__")
+            except SystemExit as e:
+                if e.code is None:
+                    exit_code = 0
+                elif isinstance(e.code, int):
+                    exit_code = e.code
+                else:
+                    print(e.code, file=sys.stderr)
+                    exit_code = 1
+            except Exception:
+                traceback.print_exc()
+                exit_code = 1
+            tracing.finish(exit_code)
+    finally:
+        stdout.flush()
+        stderr.flush()
+        sys.argv = saved_argv
+        os.environ.clear()
+        os.environ.update(saved_env)
+        os.chdir(saved_cwd)
+
+    return exit_code
+
+
+class PipelineRequestHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path != "/ping" or not self.is_authorized():
+            self.send_json(404, {"error": "Not found"})
+            return
+        self.send_json(200, {"pid": os.getpid(), "script_dir": SCRIPT_DIR})
+
+    def do_POST(self):
+        if self.path != "/run" or not self.is_authorized():
+            self.send_json(404, {"error": "Not found"})
+            return
+
+        length = int(self.headers.get("Content-Length") or 0)
+        try:
+            payload = json.loads(self.rfile.read(length))
+        except ValueError:
+            self.send_json(400, {"error": "Invalid JSON body"})
+            return
+
+        script_path = resolve_script(payload.get("script", ""))
+        if script_path is None:
+            self.send_json(400, {"error": f"Unknown script: {payload.get('script')}"})
+            return
+
+        if payload.get("version") != self.server.code_version:
+            self.send_json(409, {"error": "The scripts have changed since this daemon started"})
+            return
+
+        self.server.last_request = time.monotonic()
+        self.client_gone = False
+        self.send_response(200)
+        self.send_header("Content-Type", "application/x-ndjson")
+        self.end_headers()
+        exit_code = run_script(script_path, payload.get("args", []), payload.get("env", {}), payload.get("cwd"), self.send_event)
+        self.send_event({"exit_code": exit_code})
+        self.server.last_request = time.monotonic()
+
+    # Function summary: Sends one line of the streamed response, unless the client has gone away.
+    def send_event(self, event):
+        with self.server.output_lock:
+            if self.client_gone:
+                return
+            try:
+                self.wfile.write(json.dumps(event).encode("utf-8") + b"\n")
+                self.wfile.flush()
+            except OSError:
+                self.client_gone = True
+
+    def is_authorized(self):
+        return secrets.compare_digest(self.headers.get("X-Pipeline-Token", ""), self.server.token)
+
+    def send_json(self, status, body):
+        data = json.dumps(body).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, format, *args):
+        pass  # Keep the daemon quiet, the scripts' own output is returned to the client
+
+
+# Function summary: Shuts the server down once no request has been received for idle_timeout seconds.
+def watch_idle(server, idle_timeout):
+    while True:
+        time.sleep(min(idle_timeout, 30))
+        if time.monotonic() - server.last_request > idle_timeout:
+            server.shutdown()
+            return
+
+# Function summary: Writes the state file atomically so clients never read a half-written one.
+def write_state(state_file, state):
+    temp_file = f"{state_file}.{os.getpid()}.tmp"
+    with open(temp_file, "w") as f:
+        json.dump(state, f)
+    if os.name != "nt":
+        os.chmod(temp_file, 0o600)
+    os.replace(temp_file, state_file)
+
+def main():
+    parser = argparse.ArgumentParser(description="Runs the pipeline's Python scripts in a long-lived process.", formatter_class=argparse.ArgumentDefaultsHelpFormatter)
+    parser.add_argument("--idle-timeout", type=int, default=DEFAULT_IDLE_TIMEOUT, help="Seconds without a request before the daemon exits.")
+    args = vars(parser.parse_args())
+
+    # Taken before the imports, so files changed while they load make the version stale rather than mixed.
+    code_version = get_code_version()
+
+    # Warm up the imports the scripts pay for on every cold start.
+    import requests
+    import jinja2
+    import bitbucket_client
+
+    server = HTTPServer((HOST, 0), PipelineRequestHandler)
+    server.token = secrets.token_hex(16)
+    server.code_version = code_version
+    server.output_lock = threading.Lock()
+    server.last_request = time.monotonic()
+
+    state_file = get_state_file(code_version=code_version)
+    write_state(state_file, {"port": server.server_address[1], "token": server.token, "pid": os.getpid()})
+    threading.Thread(target=watch_idle, args=(server, args["idle_timeout"]), daemon=True).start()
+
+    try:
+        server.serve_forever()
+    finally:
+        server.server_close()
+        # Only remove the state file if another daemon has not replaced it in the meantime.
+        with contextlib.suppress(OSError, ValueError):
+            with open(state_file) as f:
+                if json.load(f).get("pid") == os.getpid():
+                    os.remove(state_file)
+
+if __name__ == "__main__":
+    main()
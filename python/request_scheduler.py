@@ -0,0 +1,185 @@
+import os
+import time
+import random
+import threading
+import email.utils
+import requests
+import cache_utils
+import tracing
+
+# Paces and retries the Bitbucket API calls of every reporting script.
+# A token bucket spreads the requests of one process out, and a Retry-After from Bitbucket is shared with
+# every build on the agent through a small cooldown file, so parallel builds back off together instead of
+# all hitting the rate limit. Failed idempotent calls are retried with jittered exponential backoff.
+
+# Constant variables:
+DEFAULT_RATE = 5            # Requests per second, can be overridden with BITBUCKET_RATE_LIMIT
+DEFAULT_BURST = 10          # Requests that may be sent at once after an idle period
+DEFAULT_MAX_RETRIES = 5     # Can be overridden with BITBUCKET_MAX_RETRIES
+BACKOFF_BASE = 1            # Seconds, doubled on each retry
+BACKOFF_MAX = 30
+MAX_RETRY_AFTER = 120       # A longer Retry-After is not waited for, the call fails instead
+RETRY_STATUS_CODES = {429, 500, 502, 503, 504}
+IDEMPOTENT_METHODS = {"GET", "PUT", "DELETE", "HEAD", "OPTIONS"}
+COOLDOWN_CACHE = "bitbucket"
+
+
+class TokenBucket:
+    # Thread safe token bucket: acquire() waits until a token is free, refilling at rate tokens per second.
+    def __init__(self, rate, capacity):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    # Function summary: Takes one token, and returns how long the caller had to wait for it.
+    def acquire(self):
+        waited = 0
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return waited
+                wait = (1 - self.tokens) / self.rate
+            time.sleep(wait)
+            waited += wait
+
+
+class DeliveryStats:
+    # Counts what happened to the requests of one script run, for the delivery summary.
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        self.requests = 0
+        self.delivered = 0
+        self.failed = 0
+        self.retries = 0
+        self.throttled = 0
+        self.waited = 0.0
+
+    def add(self, **counts):
+        with self.lock:
+            for name, value in counts.items():
+                setattr(self, name, getattr(self, name) + value)
+
+    # Function summary: Prints how many calls were delivered, retried and throttled, and the time spent waiting.
+    def print_summary(self):
+        print(f"Bitbucket delivery summary: {self.delivered}/{self.requests} calls delivered, {self.failed} failed, "
+              f"{self.retries} retries, {self.throttled} rate limited, {self.waited:.1f}s spent waiting")
+
+
+class RequestScheduler:
+    # Sends requests through a session, paced by a token bucket and retried on rate limits and server errors.
+    def __init__(self, session_factory, rate=None, burst=DEFAULT_BURST, max_retries=None):
+        self.session_factory = session_factory
+        self.bucket = TokenBucket(rate or float(os.getenv('BITBUCKET_RATE_LIMIT', DEFAULT_RATE)), burst)
+        self.max_retries = max_retries if max_retries is not None else int(os.getenv('BITBUCKET_MAX_RETRIES', DEFAULT_MAX_RETRIES))
+        self.stats = DeliveryStats()
+
+    # Function summary: Sends a request and returns the response, retrying idempotent calls that failed transiently.
+    # max_retries overrides the scheduler's own for this call, such as 0 for callers that retry by themselves.
+    # Raises requests.RequestException once the call has failed for good.
+    def request(self, method, url, idempotent=None, max_retries=None, **kwargs):
+        if idempotent is None:
+            idempotent = method.upper() in IDEMPOTENT_METHODS
+        if max_retries is None:
+            max_retries = self.max_retries
+        self.stats.add(requests=1)
+
+        attempt = 0
+        while True:
+            self.wait_for_turn()
+            sent = time.perf_counter()
+            try:
+                response = self.session_factory().request(method, url, **kwargs)
+                tracing.record_request(method, url, response.status_code, time.perf_counter() - sent, attempt)
+                response.raise_for_status()
+                self.stats.add(delivered=1)
+                return response
+            except requests.exceptions.RequestException as e:
+                if getattr(e, "response", None) is None:
+                    tracing.record_request(method, url, type(e).__name__, time.perf_counter() - sent, attempt)
+                # The delay is worked out even for the last attempt, so a Retry-After still reaches the other builds
+                delay = self.get_retry_delay(e, attempt) if idempotent else None
+                if delay is None or attempt >= max_retries:
+                    self.stats.add(failed=1)
+                    raise
+                print(f"{method} {url} failed ({describe_error(e)}), retry {attempt + 1}/{max_retries} in {delay:.1f}s")
+                self.stats.add(retries=1, waited=delay)
+                time.sleep(delay)
+                attempt += 1
+
+    # Function summary: Waits for a token and for any agent wide cooldown another build received from Bitbucket.
+    def wait_for_turn(self):
+        waited = self.bucket.acquire()
+        cooldown = get_cooldown_remaining()
+        if cooldown > 0:
+            time.sleep(cooldown)
+            waited += cooldown
+        if waited:
+            self.stats.add(waited=waited)
+            tracing.count("request_wait_seconds", waited)
+
+    # Function summary: Returns the seconds to wait before retrying the failed call, or None if it should not be retried.
+    def get_retry_delay(self, error, attempt):
+        response = getattr(error, "response", None)
+        if response is not None and response.status_code not in RETRY_STATUS_CODES:
+            return None  # Rejected, retrying will not help
+
+        retry_after = parse_retry_after(response) if response is not None else None
+        if response is not None and response.status_code == 429:
+            self.stats.add(throttled=1)
+            if retry_after is not None:
+                if retry_after > MAX_RETRY_AFTER:
+                    return None
+                set_cooldown(retry_after)
+        if retry_after is not None:
+            return retry_after
+
+        # Full jitter keeps parallel builds from retrying in lockstep
+        return random.uniform(0, min(BACKOFF_MAX, BACKOFF_BASE * 2 ** attempt))
+
+
+# Function summary: Returns the Retry-After header in seconds, from either its seconds or its HTTP date form, or None.
+def parse_retry_after(response):
+    value = response.headers.get("Retry-After")
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, email.utils.parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+def describe_error(error):
+    response = getattr(error, "response", None)
+    return f"HTTP {response.status_code}" if response is not None else type(error).__name__
+
+def get_cooldown_file():
+    return os.path.join(cache_utils.get_cache_dir(COOLDOWN_CACHE), "retry-after.json")
+
+# Function summary: Returns the seconds left of a Retry-After any build on the agent received, or 0.
+def get_cooldown_remaining():
+    cooldown = cache_utils.read_json(get_cooldown_file())
+    if not isinstance(cooldown, dict):
+        return 0
+    return max(0, min(cooldown.get("until", 0) - time.time(), MAX_RETRY_AFTER))
+
+# Function summary: Tells every build on the agent to hold its requests for the given seconds.
+def set_cooldown(seconds):
+    until = time.time() + seconds
+    if get_cooldown_remaining() >= seconds:
+        return
+    try:
+        cache_utils.write_json_atomic(get_cooldown_file(), {"until": until})
+    except OSError:
+        pass  # Only this process backs off then
@@ -1,8 +1,9 @@
 import os
 import sys
 import requests
-import json
 import argparse
+import bitbucket_client
+import build_status_queue
 
 # Command-line arguments:
 parser = argparse.ArgumentParser(description="Arguments for sending Bitbucket build statuses.", formatter_class=argparse.ArgumentDefaultsHelpFormatter)
@@ -12,10 +13,10 @@ parser.add_argument("-d", "--deployment", action='store_true', help="Flag to use
 parser.add_argument("-js", "--javascript",action='store_true', help="An optional argument to set the different build_url.")
 parser.add_argument("-desc", "--description", help="An optional argument for adding additional information to the build description.")
 parser.add_argument("-key", "--projeckey", help="An argument for sonarqube project key.")
+parser.add_argument("-q", "--queue", action='store_true', help="Queue the status for the background sender instead of waiting for Bitbucket.")
 args = vars(parser.parse_args())
 
 # Environment variables:
-access_token = os.getenv('BITBUCKET_ACCESS_TOKEN')
 pr_repo = os.getenv('JOB_REPO')
 build_id = os.getenv('BUILD_ID')
 ticket = os.getenv('TICKET_NUMBER')
@@ -42,24 +43,23 @@ else:
     else:
         build_url = f"https://jenkins.vconestoga.com/sonarqube/dashboard?id={sonar_project_key}"
 
-headers = {
-    "Accept": "application/json",
-    "Content-Type": "application/json",
-    "Authorization": "Bearer " + access_token
-}
-
 # Sending the build status to Bitbucket Cloud API.
-build_status = json.dumps( {
+build_status = {
     "key": build_id,
     "state": args['pr-status'],
     "description": description,
     "url": build_url
-} )
+}
+
+if args['queue']:
+    # Replaces any state of this build still waiting to be sent, the drainer sends the last one
+    build_status_queue.enqueue(url, build_status)
+    build_status_queue.ensure_drainer()
+    print(f"Queued build status {args['pr-status']}")
+    exit(0)
 
 try:
-    response = requests.post(url, data=build_status, headers=headers)
-    response.raise_for_status()
+    bitbucket_client.post_build_status(url, build_status)
 except requests.exceptions.RequestException as e:
-    print(f"Initial Request: {e.request.body}")
-    print(f"Response Error: {json.dumps(e.response.json())}")
+    bitbucket_client.print_request_error(e)
     exit(1)
\ No newline at end of file
@@ -0,0 +1,58 @@
+import os
+import xml.etree.ElementTree as ET
+from concurrent.futures import ProcessPoolExecutor
+import tracing
+
+# Parsers for the Unity test results and the code coverage summary.
+# They live in their own module so a process pool can import them without running a script.
+
+# Constant variables:
+PARALLEL_MIN_BYTES = 8 * 1024 * 1024  # Below this combined size, starting worker processes costs more than it saves
+
+
+# Parses the number of tests, the number failed and the failed test methods from the results XML file.
+# Streams the file in a single pass and drops every test case once it is read, so the whole tree is never held in memory.
+def parse_test_results(result_file):
+    results = {
+        "total_tests": "0",
+        "total_failed": "0",
+        "failed_tests": []
+    }
+    parents = []  # The elements that are still open, the root first
+
+    for event, element in ET.iterparse(result_file, events=("start", "end")):
+        if event == "start":
+            if not parents:
+                results["total_tests"] = element.attrib['total']
+                results["total_failed"] = element.attrib['failed']
+            parents.append(element)
+            continue
+
+        parents.pop()
+        if element.tag == 'test-case':
+            if element.get('result') == "Failed":
+                results["failed_tests"].append(element.get('methodname'))
+            # The finished test case is always its parent's last child
+            del parents[-1][-1]
+
+    return results
+
+# Parses the line coverage percentage from the code coverage HTML report.
+def get_line_coverage(result_file):
+    tree_root = ET.parse(result_file).getroot()
+    line_coverage = tree_root.find('Summary').find('Linecoverage').text
+    return line_coverage
+
+# Function summary: Runs every (parser, file) job and returns the results under the same keys.
+# The jobs run in a process pool when the files are large enough to be worth it, otherwise one after another.
+def parse_all(jobs, max_workers=None):
+    total_bytes = sum(os.path.getsize(result_file) for parser, result_file in jobs.values() if os.path.isfile(result_file))
+    tracing.count("result_bytes_read", total_bytes)
+    if len(jobs) < 2 or total_bytes < PARALLEL_MIN_BYTES:
+        with tracing.span("parse_all", jobs=len(jobs), bytes=total_bytes, parallel=False):
+            return {name: parser(result_file) for name, (parser, result_file) in jobs.items()}
+
+    with tracing.span("parse_all", jobs=len(jobs), bytes=total_bytes, parallel=True):
+        with ProcessPoolExecutor(max_workers=max_workers or len(jobs)) as executor:
+            futures = {name: executor.submit(parser, result_file) for name, (parser, result_file) in jobs.items()}
+            return {name: future.result() for name, future in futures.items()}
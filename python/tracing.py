@@ -0,0 +1,216 @@
+import os
+import json
+import time
+import threading
+import contextlib
+import functools
+import itertools
+
+# Lightweight tracing of the pipeline scripts, so a slow step can be broken down instead of guessed at.
+# A trace holds named spans with their start and duration, counters such as bytes read and annotations sent,
+# and the latency of every API request. pipeline_client.py and pipeline_daemon.py start a trace before each
+# script run and write it to <REPORT_DIR>/traces/ as one JSON file per run. Scripts and shared modules only
+# open spans and add counts, which does nothing when no trace is running.
+# Set PIPELINE_TRACE=0 to turn tracing off, or PIPELINE_TRACE_DIR to write the traces somewhere else.
+# PIPELINE_PROFILE=cprofile,tracemalloc additionally profiles the run: the cProfile stats are written next to
+# the trace as a .prof file, and the top functions and allocation sites of both are included in the trace.
+
+# Constant variables:
+TRACE_FOLDER = "traces"
+PROFILE_TOP = 25  # Functions and allocation sites listed in the trace
+
+# Global variables:
+_trace = None
+_local = threading.local()
+_run_numbers = itertools.count(1)  # Tells apart the runs of one daemon process that start in the same second
+
+
+class Trace:
+    # The spans, counters and requests recorded during one script run. Spans may be recorded from any thread.
+    def __init__(self, script, args, mode, trace_dir, started=None):
+        self.script = script
+        self.args = list(args)
+        self.mode = mode
+        self.trace_dir = trace_dir
+        self.started = time.time()
+        self.origin = started if started is not None else time.perf_counter()
+        self.spans = []
+        self.counters = {}
+        self.requests = []
+        self.lock = threading.Lock()
+        self.profiler = None
+        self.tracemalloc_started = False
+
+    def now(self):
+        return time.perf_counter() - self.origin
+
+    def add_span(self, span):
+        with self.lock:
+            self.spans.append(span)
+
+    def count(self, name, value):
+        with self.lock:
+            self.counters[name] = self.counters.get(name, 0) + value
+
+    def add_request(self, request):
+        with self.lock:
+            self.requests.append(request)
+
+    # Function summary: Turns on the profilers PIPELINE_PROFILE asks for.
+    def start_profiling(self, profile):
+        modes = {mode.strip().lower() for mode in profile.split(",") if mode.strip()}
+        if "tracemalloc" in modes:
+            import tracemalloc
+            if not tracemalloc.is_tracing():
+                tracemalloc.start()
+                self.tracemalloc_started = True
+        if "cprofile" in modes:
+            import cProfile
+            self.profiler = cProfile.Profile()
+            try:
+                self.profiler.enable()
+            except ValueError:
+                self.profiler = None  # Another profiler is already active in this interpreter
+
+    # Function summary: Stops the profilers and returns their results for the trace.
+    def stop_profiling(self, trace_path):
+        results = {}
+        if self.profiler is not None:
+            import pstats
+            self.profiler.disable()
+            profile_path = os.path.splitext(trace_path)[0] + ".prof"
+            self.profiler.dump_stats(profile_path)
+            stats = pstats.Stats(self.profiler).stats
+            top = sorted(stats.items(), key=lambda item: item[1][3], reverse=True)[:PROFILE_TOP]
+            results["cprofile"] = {
+                "file": profile_path,
+                "top_cumulative": [{"function": f"{file}:{line}({function})", "calls": calls, "own_seconds": round(own, 6), "cumulative_seconds": round(cumulative, 6)}
+                                   for (file, line, function), (primitive_calls, calls, own, cumulative, callers) in top]
+            }
+        if self.tracemalloc_started:
+            import tracemalloc
+            current, peak = tracemalloc.get_traced_memory()
+            sites = tracemalloc.take_snapshot().statistics("lineno")[:PROFILE_TOP]
+            tracemalloc.stop()
+            results["tracemalloc"] = {
+                "current_bytes": current,
+                "peak_bytes": peak,
+                "top_sites": [{"site": str(site.traceback[0]), "bytes": site.size, "blocks": site.count} for site in sites]
+            }
+        return results
+
+    # Function summary: Returns the trace as a JSON serializable dict, with the requests also summarized per method.
+    def to_dict(self, exit_code):
+        by_method = {}
+        for request in self.requests:
+            by_method.setdefault(request["method"], []).append(request["seconds"])
+        return {
+            "script": self.script,
+            "args": self.args,
+            "mode": self.mode,
+            "pid": os.getpid(),
+            "started": time.strftime("%Y-%m-%dT%H:%M:%S", time.localtime(self.started)),
+            "seconds": round(self.now(), 6),
+            "exit_code": exit_code,
+            "counters": self.counters,
+            "spans": sorted(self.spans, key=lambda span: span["start"]),
+            "request_summary": {method: summarize(durations) for method, durations in by_method.items()},
+            "requests": self.requests
+        }
+
+
+# Function summary: Returns the count, total and percentiles of a list of durations, in seconds.
+def summarize(durations):
+    ordered = sorted(durations)
+    def percentile(share):
+        return round(ordered[min(len(ordered) - 1, int(share * len(ordered)))], 6)
+    return {"count": len(ordered), "total": round(sum(ordered), 6), "p50": percentile(0.5), "p95": percentile(0.95), "max": round(ordered[-1], 6)}
+
+# Function summary: Starts the trace of a script run, unless tracing is turned off or there is nowhere to write it.
+# started is the perf_counter() value the run's timeline starts at, such as when the client process started.
+def start(script, args, mode="local", started=None):
+    global _trace
+
+    trace_dir = os.getenv("PIPELINE_TRACE_DIR") or (os.path.join(os.getenv("REPORT_DIR"), TRACE_FOLDER) if os.getenv("REPORT_DIR") else None)
+    if os.getenv("PIPELINE_TRACE", "1") == "0" or trace_dir is None:
+        _trace = None
+        return None
+
+    _trace = Trace(os.path.basename(script), args, mode, trace_dir, started)
+    _local.stack = []
+    profile = os.getenv("PIPELINE_PROFILE")
+    if profile:
+        _trace.start_profiling(profile)
+    return _trace
+
+# Function summary: Writes the running trace to its folder and returns the file's path, or None if no trace was running.
+# A trace that cannot be written is reported but never fails the script.
+def finish(exit_code=0):
+    global _trace
+
+    trace = _trace
+    _trace = None
+    if trace is None:
+        return None
+
+    name = f"{os.path.splitext(trace.script)[0]}-{time.strftime('%Y%m%d-%H%M%S', time.localtime(trace.started))}-{os.getpid()}-{next(_run_numbers)}.json"
+    trace_path = os.path.join(trace.trace_dir, name)
+    try:
+        os.makedirs(trace.trace_dir, exist_ok=True)
+        data = trace.to_dict(exit_code)
+        data["profile"] = trace.stop_profiling(trace_path)
+        with open(trace_path, "w") as f:
+            json.dump(data, f, indent=1)
+    except OSError as e:
+        print(f"Could not write the trace: {e}")
+        return None
+    return trace_path
+
+# Function summary: Records the duration of the wrapped block as a span, nested under the thread's current span.
+# Yields the span's attributes, which the block can add to, such as the number of items it handled.
+@contextlib.contextmanager
+def span(name, **attributes):
+    trace = _trace
+    if trace is None:
+        yield attributes
+        return
+
+    stack = getattr(_local, "stack", None)
+    if stack is None:
+        stack = _local.stack = []
+    parent = stack[-1] if stack else None
+    stack.append(name)
+    start_time = trace.now()
+    try:
+        yield attributes
+    except BaseException as e:
+        attributes["error"] = type(e).__name__
+        raise
+    finally:
+        stack.pop()
+        trace.add_span({"name": name, "parent": parent, "thread": threading.current_thread().name,
+                        "start": round(start_time, 6), "seconds": round(trace.now() - start_time, 6), **attributes})
+
+# Function summary: Decorator that records every call of the function as a span, named after the function by default.
+def traced(name=None):
+    def decorator(function):
+        span_name = name or function.__name__
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            with span(span_name):
+                return function(*args, **kwargs)
+        return wrapper
+    return decorator
+
+# Function summary: Adds value to a named counter of the running trace, such as bytes read.
+def count(name, value=1):
+    trace = _trace
+    if trace is not None:
+        trace.count(name, value)
+
+# Function summary: Records one API request attempt with its outcome, a status code or an error name, and its latency.
+def record_request(method, url, outcome, seconds, attempt=0):
+    trace = _trace
+    if trace is not None:
+        trace.add_request({"method": method, "path": url.split("://", 1)[-1].split("/", 1)[-1].split("?", 1)[0],
+                           "outcome": outcome, "seconds": round(seconds, 6), "attempt": attempt, "start": round(trace.now() - seconds, 6)})